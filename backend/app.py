@@ -6,39 +6,82 @@ Core capabilities:
     * File CRUD + upload/download + quota enforcement
     * Interactive terminal via WebSocket (one shell per user)
     * Admin panel: resource stats, job/process enumeration, job termination, quota management
-    * Stateless HMAC admin token (no DB state for tokens)
+    * Stateless signed admin token (keyed BLAKE2b MAC; no DB state for tokens)
 
 Design notes:
-    * All Docker SDK calls are offloaded with asyncio.to_thread to keep the event loop responsive.
+    * All Docker SDK calls (and admin DB round-trips) are offloaded with asyncio.to_thread to keep the event loop responsive.
     * Process / job listing is container‑internal using ps; the root interactive shell PID is cached.
+    * Container CPU/memory come from one long-lived stats stream per container (latest frame cached).
     * Quotas are enforced optimistically by size delta before writes / uploads.
     * Logout and kill operations are scheduled in background tasks to avoid blocking the request path.
 """
 
 import os
-import io
+import sys
+import atexit
+import logging
+import logging.handlers
+import queue
 import zipfile
 import docker
 import shutil
+import tempfile
 import asyncio
 import time
-import uuid
+import threading
+import secrets
 import hmac
 import hashlib
 import base64
+import struct
+import socket
 import re
-from collections import defaultdict, deque
+import zlib
+import stat
+import orjson
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, fields
 from starlette.websockets import WebSocketState
 from datetime import datetime, timedelta
-from fastapi import FastAPI, Form, WebSocket, WebSocketDisconnect, HTTPException, Header
+from fastapi import FastAPI, Form, WebSocket, WebSocketDisconnect, HTTPException, Header, Depends
 from fastapi import BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy import create_engine, Column, String, DateTime
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import create_engine, select, Column, String, DateTime, Integer, BigInteger
 from sqlalchemy.orm import declarative_base, sessionmaker, Session
 from sqlalchemy.exc import SQLAlchemyError
 import bcrypt
 
-app = FastAPI()
+# orjson for every JSON response body (several times faster than the stdlib encoder)
+app = FastAPI(default_response_class=ORJSONResponse)
+
+# ---- Logging ----
+# Cleanup and terminal paths log from worker threads during logout storms. Records go onto a
+# bounded queue (dropped when full, never blocking) and one listener thread writes them to stdout.
+LOG_QUEUE_MAX = 10000
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+
+_log_queue: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_MAX)
+_log_stream = logging.StreamHandler(sys.stdout)
+_log_stream.setFormatter(logging.Formatter("%(message)s"))
+_log_listener = logging.handlers.QueueListener(_log_queue, _log_stream)
+_log_listener.start()
+atexit.register(_log_listener.stop)
+
+logger = logging.getLogger("minicolab")
+logger.setLevel(logging.INFO)
+logger.addHandler(_DroppingQueueHandler(_log_queue))
+logger.propagate = False
 
 # ---- Database bootstrap (PostgreSQL preferred, fallback to SQLite) ----
 DATABASE_URL = os.getenv("DATABASE_URL")
@@ -62,14 +105,23 @@ try:
             pool_pre_ping=True,
         )
     else:
-        # Server DBs: increase pool and enable pre-ping to avoid stale connections
-        pool_size = int(os.getenv("DB_POOL_SIZE", "10"))
-        max_overflow = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+        # Server DBs: size the pool for concurrent admin polling plus login/logout bursts (keep
+        # pool_size + max_overflow below the server's max_connections), recycle hourly to drop
+        # stale connections, and fail fast instead of queueing indefinitely when the pool is
+        # exhausted. Pre-ping costs a round-trip per checkout, so it is opt-in (DB_POOL_PRE_PING=1)
+        # for networks that silently drop idle connections.
+        pool_size = int(os.getenv("DB_POOL_SIZE", "20"))
+        max_overflow = int(os.getenv("DB_MAX_OVERFLOW", "40"))
+        pool_recycle = int(os.getenv("DB_POOL_RECYCLE", "3600"))
+        pool_timeout = int(os.getenv("DB_POOL_TIMEOUT", "10"))
+        pool_pre_ping = os.getenv("DB_POOL_PRE_PING", "0").lower() in ("1", "true", "yes")
         engine = create_engine(
             DATABASE_URL,
             pool_size=pool_size,
             max_overflow=max_overflow,
-            pool_pre_ping=True,
+            pool_pre_ping=pool_pre_ping,
+            pool_recycle=pool_recycle,
+            pool_timeout=pool_timeout,
         )
 
     SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -90,20 +142,13 @@ class UserContainer(Base):
     __tablename__ = "user_containers"
     
     username = Column(String, primary_key=True, index=True)
-    container_id = Column(String, nullable=False)
+    container_id = Column(String, nullable=False, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     # Per-login session identifier to disambiguate concurrent/rapid re-logins
-    try:
-        session_id = Column(String, index=True, nullable=True)
-    except Exception:
-        pass
-    # Per-user storage quota in bytes (default 50MB). Added retroactively for legacy DBs.
-    try:
-        from sqlalchemy import Integer
-        quota_bytes = Column(Integer, default=50 * 1024 * 1024)
-    except Exception:
-        pass
+    session_id = Column(String, index=True, nullable=True)
+    # Per-user storage quota in bytes (default 50MB). Legacy DBs get it via _ensure_quota_column.
+    quota_bytes = Column(BigInteger, default=50 * 1024 * 1024)
 
 # Create tables if absent
 Base.metadata.create_all(bind=engine)
@@ -153,14 +198,22 @@ def _ensure_session_column():  # idempotent
 
 _ensure_session_column()
 
-# ---- Admin authentication model (single admin user) ----
-from sqlalchemy import Integer as _IntType
+def _ensure_container_index():  # idempotent
+    # create_all only indexes new tables; legacy DBs get the container_id index here
+    try:
+        with engine.begin() as conn:
+            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_user_containers_container_id ON user_containers (container_id)"))
+    except Exception as e:
+        print(f"[IndexMigrationWarning] Could not ensure container_id index: {e}")
 
+_ensure_container_index()
+
+# ---- Admin authentication model (single admin user) ----
 class AdminAuth(Base):
     __tablename__ = "admin_auth"
     username = Column(String, primary_key=True)
     password_hash = Column(String, nullable=False)
-    failed_count = Column(_IntType, default=0)
+    failed_count = Column(Integer, default=0)
     window_start = Column(DateTime, nullable=True)
     locked_until = Column(DateTime, nullable=True)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -169,22 +222,78 @@ class AdminAuth(Base):
 Base.metadata.create_all(bind=engine)
 
 def get_db():
-    db = SessionLocal()
-    try:
+    with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 # ---- DB helpers ----
+# Snapshot of all user rows for admin polling, reused for USER_RECORDS_TTL (matches the stats
+# refresh interval). Every write below bumps the generation so a login/logout/quota change is
+# visible on the next poll, and a load that raced a write is not stored.
+USER_RECORDS_TTL = 2.0
+_USER_RECORDS_CACHE: dict = {"gen": 0, "at": 0.0, "rows": None}
+_USER_RECORDS_LOCK = threading.Lock()
+
+# Per-user copy of the fields the file endpoints need, so editor saves don't SELECT each time.
+# Shares the generation above: any write drops every entry, and a racing load is not stored.
+USER_RECORD_TTL = 30.0
+USER_RECORD_CACHE_MAX = 1024
+
+
+@dataclass(frozen=True, slots=True)
+class UserRecord:
+    username: str
+    container_id: str
+    session_id: str | None
+    quota_bytes: int
+
+
+_USER_RECORD_CACHE: OrderedDict[str, tuple[float, UserRecord]] = OrderedDict()
+
+# Usernames that currently have a container row. Seeded from the DB at startup and kept in step
+# by create/delete_user_container, so logout can answer unknown users without a query.
+ACTIVE_USERS: set[str] = set()
+
+def _invalidate_user_records():
+    with _USER_RECORDS_LOCK:
+        _USER_RECORDS_CACHE["gen"] += 1
+        _USER_RECORDS_CACHE["rows"] = None
+        _USER_RECORD_CACHE.clear()
+
+def get_user_record(db: Session, username: str) -> UserRecord | None:
+    now = time.monotonic()
+    with _USER_RECORDS_LOCK:
+        hit = _USER_RECORD_CACHE.get(username)
+        if hit and now - hit[0] < USER_RECORD_TTL:
+            _USER_RECORD_CACHE.move_to_end(username)  # LRU, not FIFO
+            return hit[1]
+        gen = _USER_RECORDS_CACHE["gen"]
+    row = db.execute(
+        select(UserContainer.container_id, UserContainer.session_id, UserContainer.quota_bytes)
+        .where(UserContainer.username == username)
+    ).first()
+    if row is None:
+        return None
+    container_id, session_id, quota_bytes = row
+    record = UserRecord(username, container_id, session_id, quota_bytes if quota_bytes is not None else 50 * 1024 * 1024)
+    with _USER_RECORDS_LOCK:
+        if _USER_RECORDS_CACHE["gen"] == gen:
+            _USER_RECORD_CACHE[username] = (now, record)
+            _USER_RECORD_CACHE.move_to_end(username)
+            if len(_USER_RECORD_CACHE) > USER_RECORD_CACHE_MAX:
+                _USER_RECORD_CACHE.popitem(last=False)
+    return record
+
 def get_user_container(db: Session, username: str):
     return db.query(UserContainer).filter(UserContainer.username == username).first()
 
 def create_user_container(db: Session, username: str, container_id: str, session_id: str | None = None):
     # Default quota 50MB
-    sid = session_id or uuid.uuid4().hex
+    sid = session_id or secrets.token_hex(16)
     db_user = UserContainer(username=username, container_id=container_id, quota_bytes=50 * 1024 * 1024, session_id=sid)
     db.add(db_user)
     db.commit()
+    _invalidate_user_records()
+    ACTIVE_USERS.add(username)
     db.refresh(db_user)
     return db_user
 
@@ -194,12 +303,10 @@ def update_user_container(db: Session, username: str, container_id: str, session
         db_user.container_id = container_id
         db_user.updated_at = datetime.utcnow()
         # Rotate session on container change
-        try:
-            db_user.session_id = session_id or uuid.uuid4().hex
-        except Exception:
-            pass
+        db_user.session_id = session_id or secrets.token_hex(16)
         # Leave quota unchanged
         db.commit()
+        _invalidate_user_records()
         db.refresh(db_user)
     return db_user
 
@@ -208,9 +315,17 @@ def delete_user_container(db: Session, username: str):
     if db_user:
         db.delete(db_user)
         db.commit()
+        _invalidate_user_records()
+        ACTIVE_USERS.discard(username)
         return True
     return False
 
+
+@app.on_event("startup")
+def _load_active_users():
+    with SessionLocal() as db:
+        ACTIVE_USERS.update(db.scalars(select(UserContainer.username)))
+
 # ---- CORS ----
 app.add_middleware(
     CORSMiddleware,
@@ -222,31 +337,112 @@ app.add_middleware(
 
 client = docker.from_env()
 
+
+@app.on_event("startup")
+async def _configure_default_executor():
+    # asyncio.to_thread uses the default executor; the stdlib default (cpu_count + 4 workers)
+    # is too small for per-user Docker fan-out in the admin stats refresher.
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=64))
+
 BASE_WORKDIR = "./user_code"
 os.makedirs(BASE_WORKDIR, exist_ok=True)
+# Resolved once: workspace paths are built from this, so they are already absolute and
+# symlink-free and path checks only need to resolve the untrusted side.
+BASE_WORKDIR_ABS = os.path.realpath(BASE_WORKDIR)
 
-SHELL_PIDS: dict[str, dict[str, int | str]] = {}
-SHELL_PIDS_LOCK = asyncio.Lock()
 
-# Active terminal WebSocket connections (for forced closure on logout)
-TERMINAL_CONNECTIONS: dict[str, set[WebSocket]] = {}
-TERMINAL_CONNECTIONS_LOCK = asyncio.Lock()
+def _within_workdir(path: str, user_workdir: str, follow_symlinks: bool = True) -> bool:
+    """True if ``path`` resolves inside ``user_workdir`` (which must come from BASE_WORKDIR_ABS).
+
+    Symlinks are resolved, so a link pointing outside the workspace is rejected. With
+    ``follow_symlinks=False`` only the parent is resolved: rename/delete act on the link itself.
+    """
+    if follow_symlinks:
+        resolved = os.path.realpath(path)
+    else:
+        head, tail = os.path.split(os.path.normpath(path))
+        resolved = os.path.join(os.path.realpath(head), tail)
+    try:
+        # commonpath, not startswith: "/ws/abc" must not accept "/ws/abcdef"
+        return os.path.commonpath([resolved, user_workdir]) == user_workdir
+    except ValueError:  # different drives (Windows)
+        return False
 
 
-def _sanitize_username_for_pid(username: str) -> str:
-    return re.sub(r"[^a-zA-Z0-9_-]", "_", username)
+def _active_workspace(db: Session, username: str) -> tuple[UserRecord, str]:
+    """Shared preamble of the file endpoints: (record, user_workdir) or 404/409."""
+    user_container = get_user_record(db, username)
+    if not user_container:
+        raise HTTPException(status_code=404, detail="User not logged in")
+    if not getattr(user_container, 'session_id', None):
+        raise HTTPException(status_code=409, detail="No active session. Please login/start container again")
+    return user_container, os.path.join(BASE_WORKDIR_ABS, user_container.session_id)
 
 
-def _pid_file_path(username: str) -> str:
-    return f"/tmp/mc_shell_{_sanitize_username_for_pid(username)}.pid"
+async def require_active_workspace(username: str, db: Session = Depends(get_db)) -> tuple[UserRecord, str]:
+    """Dependency for routes taking ``username`` from the path."""
+    return _active_workspace(db, username)
 
-# ---- Admin token (stateless HMAC) ----
-# Format: b64(expiry).b64(random16).b64(HMAC_SHA256(expiry.random16))
-# Keeps validation O(1) with no storage.
+
+async def require_active_workspace_form(username: str = Form(...), db: Session = Depends(get_db)) -> tuple[UserRecord, str]:
+    """Dependency for routes taking ``username`` from the form body."""
+    return _active_workspace(db, username)
+
+# Interactive shell PID per user. No lock (same rule as TERMINAL_CONNECTIONS below): every
+# read-modify-write runs on the event loop without an await in the middle.
+SHELL_PIDS: dict[str, dict[str, int | str]] = {}
+
+# Active terminal WebSocket connections (for forced closure on logout)
+# No lock: every mutation runs on the event loop with no await between read and write, so tasks
+# cannot interleave inside one.
+TERMINAL_CONNECTIONS: defaultdict[str, set[WebSocket]] = defaultdict(set)
+
+
+# The terminal's bash announces its PID in-band with a private OSC escape (ignored by xterm);
+# the terminal bridge strips it from the stream and registers the PID without a Docker exec.
+_SHELL_PID_OSC = "7770"
+_SHELL_PID_PREFIX = f"\x1b]{_SHELL_PID_OSC};".encode()
+_SHELL_PID_MARKER_RE = re.compile(re.escape(_SHELL_PID_PREFIX) + rb"(\d+)\x07")
+
+# Pause reading a terminal's exec socket once this much output is queued for a slow browser
+TERMINAL_OUTPUT_HIGH_WATER = 1024 * 1024
+# Output bursts (ls -R, build logs) are merged into one frame per TERMINAL_FLUSH_DELAY seconds,
+# or sent as soon as TERMINAL_FLUSH_BYTES are queued; 2 ms is below what a user can notice on echo.
+TERMINAL_FLUSH_DELAY = 0.002
+TERMINAL_FLUSH_BYTES = 16 * 1024
+# Exec-socket reads land in one reusable buffer of this size per terminal (a burst takes one recv)
+TERMINAL_RECV_SIZE = 64 * 1024
+# Keystrokes/pastes queued for the shell; the WebSocket receive loop waits while this is exceeded
+TERMINAL_INPUT_MAX = 256 * 1024
+# A terminal whose WebSocket dropped keeps its shell this long for the browser to reconnect
+TERMINAL_REATTACH_TTL = 30.0
+# Threads for exec streams without a selectable fd (Windows named pipe, SSH): each such terminal
+# parks one thread in recv(), so keep them off the default executor used for Docker/DB/file work.
+TERMINAL_EXECUTOR = ThreadPoolExecutor(max_workers=256, thread_name_prefix="term-io")
+
+
+def _exec_raw_socket(sock) -> socket.socket | None:
+    """Plain socket under docker-py's exec stream (unix socket / TCP), or None when there is no
+    selectable fd (Windows named pipe, SSH channel, TLS)."""
+    raw = getattr(sock, "_sock", sock)
+    return raw if type(raw) is socket.socket else None
+
+# ---- Admin token (stateless keyed MAC) ----
+# Format: b64(expiry_u64le || random8).b64(BLAKE2b-128 keyed MAC over those 16 bytes)
+# Keeps validation O(1) with no storage; one-pass BLAKE2b is cheaper than HMAC-SHA256.
 
 ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD", "admin123")
 ADMIN_TOKEN_TTL = 60 * 60 * 8  # 8 hours
-ADMIN_SECRET = os.getenv("ADMIN_SECRET") or uuid.uuid4().hex  # ephemeral secret if not provided
+ADMIN_SECRET = os.getenv("ADMIN_SECRET") or secrets.token_hex(16)  # ephemeral secret if not provided
+_ADMIN_KEY = ADMIN_SECRET.encode()
+if len(_ADMIN_KEY) > hashlib.blake2b.MAX_KEY_SIZE:
+    _ADMIN_KEY = hashlib.blake2b(_ADMIN_KEY).digest()
+_ADMIN_TOKEN_PAYLOAD = struct.Struct("<Q8s")  # expiry (unix seconds), random nonce
+# Tokens that already passed the MAC check -> expiry. The dashboard repeats the same token on
+# every call, so those skip the decode + MAC; only valid tokens are stored, so probing can't grow it.
+# LRU: a hit moves the token to the end, so the dashboard's live token is the last to be evicted.
+_ADMIN_TOKEN_MEMO: OrderedDict[str, int] = OrderedDict()
+_ADMIN_TOKEN_MEMO_MAX = 64
 
 def _b64url(data: bytes) -> str:
     return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
@@ -255,63 +451,173 @@ def _b64url_decode(data: str) -> bytes:
     pad = '=' * (-len(data) % 4)
     return base64.urlsafe_b64decode(data + pad)
 
+def _admin_mac(payload: bytes) -> bytes:
+    return hashlib.blake2b(payload, key=_ADMIN_KEY, digest_size=16).digest()
+
 def _issue_admin_token() -> str:
     expiry = int(time.time()) + ADMIN_TOKEN_TTL
-    rid = uuid.uuid4().hex[:16]
-    unsigned = f"{expiry}.{rid}"
-    sig = hmac.new(ADMIN_SECRET.encode(), unsigned.encode(), hashlib.sha256).digest()
-    token = f"{_b64url(str(expiry).encode())}.{_b64url(rid.encode())}.{_b64url(sig)}"
-    return token
+    payload = _ADMIN_TOKEN_PAYLOAD.pack(expiry, os.urandom(8))
+    return f"{_b64url(payload)}.{_b64url(_admin_mac(payload))}"
 
-def _validate_admin(token: str | None):
+def _validate_admin(token: str | None) -> int:
+    """Validate an admin token; returns its expiry (unix seconds) or raises 401."""
     if not token:
         raise HTTPException(status_code=401, detail="Missing admin token")
+    expiry = _ADMIN_TOKEN_MEMO.get(token)
+    if expiry is not None:
+        if time.time() > expiry:
+            _ADMIN_TOKEN_MEMO.pop(token, None)
+            raise HTTPException(status_code=401, detail="Expired admin token")
+        _ADMIN_TOKEN_MEMO.move_to_end(token)
+        return expiry
     try:
-        parts = token.split('.')
-        if len(parts) != 3:
+        payload_s, sep, sig_s = token.partition('.')
+        if not sep:
             raise ValueError("bad parts")
-        expiry_s = _b64url_decode(parts[0]).decode()
-        rid = _b64url_decode(parts[1]).decode()  # not used except for signature binding
-        sig_supplied = _b64url_decode(parts[2])
-        unsigned = f"{expiry_s}.{rid}".encode()
-        sig_expected = hmac.new(ADMIN_SECRET.encode(), unsigned, hashlib.sha256).digest()
-        if not hmac.compare_digest(sig_supplied, sig_expected):
+        payload = _b64url_decode(payload_s)
+        if len(payload) != _ADMIN_TOKEN_PAYLOAD.size:
+            raise ValueError("bad payload")
+        if not hmac.compare_digest(_b64url_decode(sig_s), _admin_mac(payload)):
             raise ValueError("signature mismatch")
-        expiry = int(expiry_s)
-        if time.time() > expiry:
-            raise HTTPException(status_code=401, detail="Expired admin token")
-    except HTTPException:
-        # Re-raise explicitly set HTTPException
-        raise
+        expiry, _ = _ADMIN_TOKEN_PAYLOAD.unpack(payload)
     except Exception as e:  # noqa: BLE001
         print(f"[ADMIN_AUTH] Invalid token structure/reason: {e}")
         raise HTTPException(status_code=401, detail="Invalid admin token")
+    if time.time() > expiry:
+        raise HTTPException(status_code=401, detail="Expired admin token")
+    _ADMIN_TOKEN_MEMO[token] = expiry
+    if len(_ADMIN_TOKEN_MEMO) > _ADMIN_TOKEN_MEMO_MAX:
+        _ADMIN_TOKEN_MEMO.popitem(last=False)
+    return expiry
 
 # Seed admin credentials in DB if missing
 def _ensure_admin_seed():
-    db = None
     try:
-        db = SessionLocal()
-        rec = db.query(AdminAuth).filter(AdminAuth.username == 'admin').first()
-        if rec is None:
-            # Hash ADMIN_PASSWORD env value
-            pw_bytes = (os.getenv("ADMIN_PASSWORD", "admin123")).encode("utf-8")
-            pw_hash = bcrypt.hashpw(pw_bytes, bcrypt.gensalt(rounds=12)).decode("utf-8")
-            admin = AdminAuth(username='admin', password_hash=pw_hash, failed_count=0, window_start=None, locked_until=None)
-            db.add(admin)
-            db.commit()
-            print("[AdminSeed] Admin credentials seeded from ADMIN_PASSWORD env.")
+        with SessionLocal() as db:
+            rec = db.query(AdminAuth).filter(AdminAuth.username == 'admin').first()
+            if rec is None:
+                # Hash ADMIN_PASSWORD env value
+                pw_bytes = (os.getenv("ADMIN_PASSWORD", "admin123")).encode("utf-8")
+                pw_hash = bcrypt.hashpw(pw_bytes, bcrypt.gensalt(rounds=12)).decode("utf-8")
+                admin = AdminAuth(username='admin', password_hash=pw_hash, failed_count=0, window_start=None, locked_until=None)
+                db.add(admin)
+                db.commit()
+                print("[AdminSeed] Admin credentials seeded from ADMIN_PASSWORD env.")
     except Exception as e:
         print(f"[AdminSeedWarning] Failed to seed admin credentials: {e}")
-    finally:
-        try:
-            if db:
-                db.close()
-        except Exception:
-            pass
 
 _ensure_admin_seed()
 
+# ---- Container stats streams ----
+# `container.stats(stream=False)` makes the daemon sample twice ~1s apart, so every poll paid a
+# fixed 1s floor per container. Instead keep one long-lived `stats(stream=True)` reader per
+# container (daemon thread) that stores the latest frame; polls read it in O(1). A reader exits
+# when its container disappears, when stopped explicitly, or after STATS_STREAM_IDLE seconds
+# without a read.
+STATS_STREAM_IDLE = 30.0
+_STATS_STREAMS: dict[str, dict] = {}  # container_id -> {"stop": Event, "last_read": float, "frame": dict | None}
+_STATS_STREAMS_LOCK = threading.Lock()
+
+
+def _stats_stream_worker(container_id: str, entry: dict):
+    stream = None
+    try:
+        container = client.containers.get(container_id)
+        stream = container.stats(stream=True, decode=True)
+        for frame in stream:
+            if entry["stop"].is_set() or time.monotonic() - entry["last_read"] > STATS_STREAM_IDLE:
+                break
+            entry["frame"] = frame
+    except Exception:
+        pass
+    finally:
+        if stream is not None:
+            try:
+                stream.close()
+            except Exception:
+                pass
+        with _STATS_STREAMS_LOCK:
+            if _STATS_STREAMS.get(container_id) is entry:
+                _STATS_STREAMS.pop(container_id, None)
+
+
+def _latest_stats_frame(container_id: str) -> dict | None:
+    """Return the most recent streamed stats frame, starting a reader on first use."""
+    with _STATS_STREAMS_LOCK:
+        entry = _STATS_STREAMS.get(container_id)
+        if entry is None:
+            entry = {"stop": threading.Event(), "last_read": time.monotonic(), "frame": None}
+            _STATS_STREAMS[container_id] = entry
+            threading.Thread(
+                target=_stats_stream_worker,
+                args=(container_id, entry),
+                name=f"stats-{container_id[:12]}",
+                daemon=True,
+            ).start()
+        else:
+            entry["last_read"] = time.monotonic()
+    return entry["frame"]
+
+
+def _stop_stats_stream(container_id: str | None):
+    if not container_id:
+        return
+    with _STATS_STREAMS_LOCK:
+        entry = _STATS_STREAMS.pop(container_id, None)
+    if entry:
+        entry["stop"].set()
+
+
+# ---- Container status cache ----
+# auth / login / terminal attach only need the container state; share one inspect per
+# CONTAINER_STATUS_TTL instead of hitting the daemon on every request. The admin stats refresh
+# feeds it too, and every removal path forgets the entry.
+CONTAINER_STATUS_TTL = 2.0
+_CONTAINER_STATUS: dict[str, tuple[str | None, float]] = {}  # container_id -> (status or None if gone, fetched_at)
+
+
+def _inspect_container_status(container_id: str) -> str | None:
+    try:
+        return client.api.inspect_container(container_id)["State"]["Status"]
+    except docker.errors.NotFound:
+        return None
+
+
+def _remember_container_status(container_id: str, status: str | None):
+    now = time.monotonic()
+    if len(_CONTAINER_STATUS) > 1024:
+        for cid in [k for k, (_, at) in _CONTAINER_STATUS.items() if now - at >= CONTAINER_STATUS_TTL]:
+            _CONTAINER_STATUS.pop(cid, None)
+    _CONTAINER_STATUS[container_id] = (status, now)
+
+
+def _forget_container_status(container_id: str | None):
+    if container_id:
+        _CONTAINER_STATUS.pop(container_id, None)
+
+
+async def get_container_status(container_id: str) -> str | None:
+    """Container state ("running", "exited", ...) or None if it no longer exists."""
+    hit = _CONTAINER_STATUS.get(container_id)
+    if hit and time.monotonic() - hit[1] < CONTAINER_STATUS_TTL:
+        return hit[0]
+    status = await asyncio.to_thread(_inspect_container_status, container_id)
+    _remember_container_status(container_id, status)
+    return status
+
+
+def _stop_and_remove_container(container_id: str):
+    """Kill + remove a container in one API call (raises docker.errors.NotFound).
+
+    No graceful stop: the session is being thrown away, and stop() would wait out the 10 s
+    SIGTERM grace period. v=True also drops the container's anonymous volumes. The stats stream
+    and cached status for the id are dropped first, so nothing outlives the container.
+    """
+    _stop_stats_stream(container_id)
+    _forget_container_status(container_id)
+    client.api.remove_container(container_id, v=True, force=True)
+
+
 async def _container_stats_safe(container):
     """Return container (cpu%, mem_usage, mem_limit, mem%, status); tolerate transient errors."""
     cpu_percent = 0.0
@@ -320,15 +626,18 @@ async def _container_stats_safe(container):
     mem_percent = 0.0
     status = "unknown"
     try:
-        await asyncio.to_thread(container.reload)
+        # Caller just fetched the container via containers.get (a fresh inspect); no reload needed
         status = container.status
-        raw = await asyncio.to_thread(container.stats, stream=False)
+        raw = _latest_stats_frame(container.id)
+        if not raw:
+            # Reader just started; first frame arrives within ~1s
+            return cpu_percent, mem_usage, mem_limit, mem_percent, status
         # Memory
         mem_usage = int(raw.get('memory_stats', {}).get('usage') or 0)
         mem_limit = int(raw.get('memory_stats', {}).get('limit') or 0)
         if mem_limit > 0:
             mem_percent = (mem_usage / mem_limit) * 100.0
-        # CPU calculation (docker formula simplified)
+        # CPU calculation (docker formula simplified); streamed frames carry the previous sample in precpu_stats
         cpu_stats = raw.get('cpu_stats', {})
         precpu_stats = raw.get('precpu_stats', {})
         total_usage = cpu_stats.get('cpu_usage', {}).get('total_usage', 0)
@@ -344,69 +653,176 @@ async def _container_stats_safe(container):
         pass
     return cpu_percent, mem_usage, mem_limit, mem_percent, status
 
+# Per-directory size cache: dir path -> (st_mtime_ns, cached_at, direct file bytes, subdirs).
+# A directory's mtime moves whenever an entry is added, removed or renamed in it, so on a hit we
+# skip its scandir and only stat it, then descend into the remembered subdirectories. In-place
+# growth of an existing file does not touch the mtime: API writes invalidate explicitly and
+# DIR_SIZE_MAX_AGE bounds drift from writes made inside the container.
+_DIR_SIZE_CACHE: dict[str, tuple[int, float, int, tuple[str, ...]]] = {}
+_DIR_SIZE_LOCK = threading.Lock()
+DIR_SIZE_MAX_AGE = 30.0
+
+
 def _dir_size(path: str) -> int:
     total = 0
-    for root, _, files in os.walk(path):
-        for f in files:
-            try:
-                fp = os.path.join(root, f)
-                total += os.path.getsize(fp)
-            except OSError:
-                continue
+    stack = [path]
+    now = time.monotonic()
+    while stack:
+        current = stack.pop()
+        try:
+            mtime_ns = os.stat(current).st_mtime_ns
+        except OSError:
+            with _DIR_SIZE_LOCK:
+                _DIR_SIZE_CACHE.pop(current, None)
+            continue
+        with _DIR_SIZE_LOCK:
+            hit = _DIR_SIZE_CACHE.get(current)
+        if hit and hit[0] == mtime_ns and now - hit[1] < DIR_SIZE_MAX_AGE:
+            total += hit[2]
+            stack.extend(hit[3])
+            continue
+        # Miss: scandir once; DirEntry carries d_type and caches stat (one syscall per file)
+        files_size = 0
+        subdirs: list[str] = []
+        try:
+            with os.scandir(current) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.path)
+                        else:
+                            files_size += entry.stat(follow_symlinks=False).st_size
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+        with _DIR_SIZE_LOCK:
+            _DIR_SIZE_CACHE[current] = (mtime_ns, now, files_size, tuple(subdirs))
+        if hit:
+            # Forget subtrees that were removed or renamed away since the last scan
+            for gone in set(hit[3]).difference(subdirs):
+                _invalidate_dir_size(gone)
+        total += files_size
+        stack.extend(subdirs)
     return total
 
 
-async def _store_shell_pid(container, username: str, container_id: str) -> int | None:
-    pid_file = _pid_file_path(username)
-    # NOTE (performance fix): Previously we retried 40 times regardless of exit_code, causing
-    # ~60s delays in admin stats when no terminal (and thus no pid file) existed. We now break
-    # immediately if the pid file is missing (exit_code != 0). This makes the "no terminal yet"
-    # path O(1) instead of O(N * exec_run latency).
-    for _ in range(8):  # a few quick retries only when file might be about to appear
-        try:
-            res = await asyncio.to_thread(container.exec_run, ["bash", "-lc", f"cat {pid_file}"], demux=False)
-        except Exception:
-            break
-        output = getattr(res, "output", b"")
-        exit_code = getattr(res, "exit_code", 1)
-        if exit_code != 0:
-            # File absent; no interactive shell has started. Abort early.
-            break
-        if isinstance(output, (bytes, bytearray)):
-            text = output.decode("utf-8", errors="ignore").strip()
-            if text:
-                try:
-                    pid = int(text.splitlines()[-1].strip())
-                except ValueError:
-                    pid = None
-                if pid and pid > 0:
-                    async with SHELL_PIDS_LOCK:
-                        SHELL_PIDS[username] = {"pid": pid, "pid_file": pid_file, "container_id": container_id}
-                    return pid
-        await asyncio.sleep(0.1)
+def _invalidate_dir_size(path: str):
+    """Drop cached sizes for ``path`` and everything below it (call after writing under it)."""
+    prefix = os.path.join(path, "")
+    with _DIR_SIZE_LOCK:
+        _DIR_SIZE_CACHE.pop(path, None)
+        for key in [k for k in _DIR_SIZE_CACHE if k.startswith(prefix)]:
+            del _DIR_SIZE_CACHE[key]
+
+
+def _rmtree_at(dir_fd: int):
+    with os.scandir(dir_fd) as it:
+        entries = [(entry.name, entry.is_dir(follow_symlinks=False)) for entry in it]
+    for name, is_dir in entries:
+        if is_dir:
+            # O_NOFOLLOW: a directory swapped for a symlink mid-walk is not followed
+            fd = os.open(name, os.O_RDONLY | os.O_DIRECTORY | os.O_NOFOLLOW, dir_fd=dir_fd)
+            try:
+                _rmtree_at(fd)
+            finally:
+                os.close(fd)
+            os.rmdir(name, dir_fd=dir_fd)
+        else:
+            os.unlink(name, dir_fd=dir_fd)
+
+
+def _fast_rmtree(path: str):
+    """Remove a tree with one unlink/rmdir per entry: types come from the dirent (scandir) and
+    removal is relative to open directory fds, so no file is ever stat()ed. Falls back to
+    shutil.rmtree where fd-relative calls are unavailable (Windows)."""
+    if os.scandir not in os.supports_fd or os.unlink not in os.supports_dir_fd:
+        shutil.rmtree(path)
+        return
+    fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY | os.O_NOFOLLOW)
+    try:
+        _rmtree_at(fd)
+    finally:
+        os.close(fd)
+    os.rmdir(path)
+
+
+# Running byte count per workspace so the quota checks on save/upload don't rescan the tree.
+# Seeded by one _dir_size walk and adjusted by the file endpoints; programs in the container write
+# to the workspace too, so the figure is re-derived once it is WORKSPACE_USAGE_RESYNC seconds old.
+_WORKSPACE_USAGE: dict[str, list] = {}  # user_workdir -> [used bytes, seeded_at]
+_WORKSPACE_USAGE_LOCK = threading.Lock()
+WORKSPACE_USAGE_RESYNC = 60.0
+
+
+def _workspace_usage(user_workdir: str) -> int:
+    now = time.monotonic()
+    with _WORKSPACE_USAGE_LOCK:
+        hit = _WORKSPACE_USAGE.get(user_workdir)
+        if hit and now - hit[1] < WORKSPACE_USAGE_RESYNC:
+            return hit[0]
+    used = _dir_size(user_workdir) if os.path.isdir(user_workdir) else 0
+    with _WORKSPACE_USAGE_LOCK:
+        _WORKSPACE_USAGE[user_workdir] = [used, now]
+    return used
+
+
+def _adjust_workspace_usage(user_workdir: str, delta: int):
+    with _WORKSPACE_USAGE_LOCK:
+        hit = _WORKSPACE_USAGE.get(user_workdir)
+        if hit:
+            hit[0] = max(0, hit[0] + delta)
+
+
+def _forget_workspace_usage(user_workdir: str):
+    with _WORKSPACE_USAGE_LOCK:
+        _WORKSPACE_USAGE.pop(user_workdir, None)
+
+
+# Dedicated pool for workspace scans so several trees are walked concurrently (scandir/stat
+# release the GIL) without competing with Docker calls on the default executor.
+SIZE_EXEC = ThreadPoolExecutor(max_workers=4, thread_name_prefix="dir-size")
+
+
+def _register_shell_pid(username: str, pid: int, container_id: str):
+    SHELL_PIDS[username] = {"pid": pid, "container_id": container_id}
+
+
+def _shell_pid(username: str, container_id: str) -> int | None:
+    """PID of the user's terminal bash, as announced in-band by the terminal bridge (None if no terminal)."""
+    entry = SHELL_PIDS.get(username)
+    if entry and entry.get("container_id") == container_id:
+        pid_val = entry.get("pid")
+        if isinstance(pid_val, int) and pid_val > 0:
+            return pid_val
     return None
 
 
-async def _ensure_shell_pid(container, username: str, container_id: str) -> int | None:
-    async with SHELL_PIDS_LOCK:
-        entry = SHELL_PIDS.get(username)
-        if entry and entry.get("container_id") == container_id:
-            pid_val = entry.get("pid")
-            if isinstance(pid_val, int) and pid_val > 0:
-                return pid_val
-    # Attempt pid file read (supports app restarts)
-    pid = await _store_shell_pid(container, username, container_id)
-    return pid
+# One `ps -eo pid,ppid,pcpu,pmem,etimes,cmd` row; [ \t] (not \s) so a match never spans lines
+_PS_LINE_RE = re.compile(rb"^[ \t]*(\d+)[ \t]+(\d+)[ \t]+(\S+)[ \t]+(\S+)[ \t]+(\d+)[ \t]+(.+)$", re.M)
+
+
+@dataclass(slots=True)
+class JobRow:
+    """One shell-descended process; fixed shape so orjson encodes it without a dict walk."""
+    pid: int
+    command: str
+    cpu_percent: float
+    mem_percent: float
+    elapsed_seconds: int
 
 
 async def _collect_jobs(container, username: str, container_id: str):
-    shell_pid = await _ensure_shell_pid(container, username, container_id)
+    shell_pid = _shell_pid(username, container_id)
     if not shell_pid:
-        return None, [], {}, {}
+        return None, []
     try:
+        # Exec ps directly; a `bash -lc` wrapper forked a login shell (and sourced profiles) on
+        # every poll. `docker top` is not used: it reports host-namespace PIDs, while the shell PID
+        # and kill targets are container-namespace PIDs.
         res = await asyncio.to_thread(
             container.exec_run,
-            ["bash", "-lc", "ps -eo pid,ppid,pcpu,pmem,etimes,cmd --no-headers"],
+            ["ps", "-eo", "pid,ppid,pcpu,pmem,etimes,cmd", "--no-headers"],
             demux=False,
         )
     except Exception as e:
@@ -415,200 +831,296 @@ async def _collect_jobs(container, username: str, container_id: str):
     exit_code = getattr(res, "exit_code", 1)
     if exit_code != 0 or not isinstance(output, (bytes, bytearray)):
         raise HTTPException(status_code=500, detail="Failed to read process table")
-    lines = output.decode("utf-8", errors="ignore").splitlines()
-    proc_map: dict[int, dict[str, object]] = {}
-    children: dict[int, list[int]] = defaultdict(list)
-    for line in lines:
-        line = line.strip()
-        if not line:
-            continue
-        parts = line.split(None, 5)
-        if len(parts) < 6:
-            continue
+    # Flat parallel columns indexed by ps row; children are found by binary search over
+    # the rows sorted by ppid instead of building a dict of per-parent lists.
+    pids: list[int] = []
+    ppids: list[int] = []
+    cpus: list[float] = []
+    mems: list[float] = []
+    elapsed: list[int] = []
+    cmds: list[str] = []
+    shell_row = -1
+    # Single regex scan over the raw bytes; only the command column is decoded
+    for m in _PS_LINE_RE.finditer(output):
+        pid_b, ppid_b, cpu_b, mem_b, elapsed_b, cmd_b = m.groups()
         try:
-            pid = int(parts[0])
-            ppid = int(parts[1])
-            cpu = float(parts[2]) if parts[2] != 'nan' else 0.0
-            mem = float(parts[3]) if parts[3] != 'nan' else 0.0
-            elapsed = int(parts[4])
-            cmd = parts[5].strip()
-        except Exception:
-            continue
-        proc_map[pid] = {
-            "ppid": ppid,
-            "cpu": round(cpu, 2),
-            "mem": round(mem, 2),
-            "elapsed": elapsed,
-            "cmd": cmd,
-        }
-        children[ppid].append(pid)
-
-    jobs: list[dict[str, object]] = []
-    visited: set[int] = set()
-    queue: deque[int] = deque(children.get(shell_pid, []))
-    while queue:
-        current = queue.popleft()
-        if current in visited:
-            continue
-        visited.add(current)
-        info = proc_map.get(current)
-        if not info:
+            pid = int(pid_b)
+            ppid = int(ppid_b)
+            cpu = float(cpu_b) if cpu_b != b'nan' else 0.0
+            mem = float(mem_b) if mem_b != b'nan' else 0.0
+            secs = int(elapsed_b)
+        except ValueError:
             continue
-        jobs.append({
-            "pid": current,
-            "command": info["cmd"],
-            "cpu_percent": info["cpu"],
-            "mem_percent": info["mem"],
-            "elapsed_seconds": info["elapsed"],
-        })
-        queue.extend(children.get(current, []))
+        if pid == shell_pid:
+            shell_row = len(pids)
+        pids.append(pid)
+        ppids.append(ppid)
+        cpus.append(round(cpu, 2))
+        mems.append(round(mem, 2))
+        elapsed.append(secs)
+        cmds.append(cmd_b.decode("utf-8", errors="ignore").strip())
+
+    order = sorted(range(len(pids)), key=ppids.__getitem__)
+    sorted_ppids = [ppids[i] for i in order]
+    visited = bytearray(len(pids))
+
+    jobs: list[JobRow] = []
+    # Breadth-first over row indices; `frontier` doubles as the queue (head pointer)
+    frontier: list[int] = []
+    parent = shell_pid
+    head = 0
+    while True:
+        lo = bisect_left(sorted_ppids, parent)
+        hi = bisect_right(sorted_ppids, parent, lo)
+        for k in range(lo, hi):
+            row = order[k]
+            if not visited[row]:
+                visited[row] = 1
+                frontier.append(row)
+        if head >= len(frontier):
+            break
+        row = frontier[head]
+        head += 1
+        jobs.append(JobRow(pids[row], cmds[row], cpus[row], mems[row], elapsed[row]))
+        parent = pids[row]
 
     # Hide idle base shell; include only if the user replaced it (exec python, node, etc.).
-    shell_info = proc_map.get(shell_pid)
     base_shell_names = {"bash", "/bin/bash", "sh", "/bin/sh"}
-    if shell_info:
-        cmd_text = str(shell_info.get("cmd", "")).strip()
+    if shell_row >= 0:
+        cmd_text = cmds[shell_row]
         leading = cmd_text.split()[0] if cmd_text else ""
         if leading and leading not in base_shell_names:
-            jobs.append({
-                "pid": shell_pid,
-                "command": f"{cmd_text} (shell)",
-                "cpu_percent": shell_info.get("cpu", 0.0),
-                "mem_percent": shell_info.get("mem", 0.0),
-                "elapsed_seconds": shell_info.get("elapsed", 0),
-            })
+            jobs.append(JobRow(shell_pid, f"{cmd_text} (shell)", cpus[shell_row], mems[shell_row], elapsed[shell_row]))
+
+    return shell_pid, jobs
+
+# bcrypt (~250ms per call) gets its own small pool so login bursts cannot starve the shared
+# default executor that Docker SDK / DB calls go through.
+_CRYPTO_EXEC = ThreadPoolExecutor(max_workers=2, thread_name_prefix="bcrypt")
+
+
+async def _bcrypt(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(_CRYPTO_EXEC, fn, *args)
+
+
+def _query_admin_record(db: Session):
+    return db.query(AdminAuth).filter(AdminAuth.username == 'admin').first()
+
+
+def _insert_admin_record(db: Session, pw_hash: str):
+    rec = AdminAuth(username='admin', password_hash=pw_hash, failed_count=0, window_start=None, locked_until=None)
+    db.add(rec)
+    db.commit()
+    db.refresh(rec)
+    return rec
+
+
+async def _get_admin_record(db: Session):
+    rec = await asyncio.to_thread(_query_admin_record, db)
+    # If somehow missing, seed from env (hashing on the bcrypt pool, not the default executor)
+    if rec is None:
+        pw_hash = await _bcrypt(bcrypt.hashpw, ADMIN_PASSWORD.encode('utf-8'), bcrypt.gensalt(rounds=12))
+        rec = await asyncio.to_thread(_insert_admin_record, db, pw_hash.decode('utf-8'))
+    return rec
+
+
+def _record_admin_login(db: Session, rec: AdminAuth, ok: bool, now: datetime) -> datetime | None:
+    """Persist the outcome of a login attempt (reset on success, count/lock on failure).
+    Returns the resulting locked_until, read before the commit expires ``rec``."""
+    if ok:
+        rec.failed_count = 0
+        rec.window_start = None
+        rec.locked_until = None
+    else:
+        one_hour = timedelta(hours=1)
+        if (rec.window_start is None) or (now - rec.window_start > one_hour):
+            rec.window_start = now
+            rec.failed_count = 1
+        else:
+            rec.failed_count = (rec.failed_count or 0) + 1
+        if rec.failed_count >= 5:
+            rec.locked_until = now + one_hour
+    rec.updated_at = now
+    locked_until = rec.locked_until
+    db.commit()
+    return locked_until
+
+
+# Recent successful admin password checks: HMAC(secret, stored_hash || password) -> expiry.
+# Skips the ~250ms bcrypt for repeated correct logins without keeping the plaintext around;
+# keying on the stored hash means a password change invalidates every entry. Failed attempts
+# are never cached, so the lockout policy still sees each one.
+_ADMIN_VERIFY_CACHE: OrderedDict[bytes, float] = OrderedDict()
+_ADMIN_VERIFY_TTL = 60.0
+_ADMIN_VERIFY_MAX = 16
+
+
+async def _verify_admin_password(password: str, password_hash: str) -> bool:
+    key = hmac.digest(_ADMIN_KEY, password_hash.encode('utf-8') + b"\0" + password.encode('utf-8'), 'sha256')
+    now = time.monotonic()
+    expiry = _ADMIN_VERIFY_CACHE.get(key)
+    if expiry is not None:
+        if now < expiry:
+            return True
+        _ADMIN_VERIFY_CACHE.pop(key, None)
+    try:
+        ok = await _bcrypt(bcrypt.checkpw, password.encode('utf-8'), password_hash.encode('utf-8'))
+    except Exception:
+        ok = False
+    if ok:
+        _ADMIN_VERIFY_CACHE[key] = now + _ADMIN_VERIFY_TTL
+        _ADMIN_VERIFY_CACHE.move_to_end(key)
+        while len(_ADMIN_VERIFY_CACHE) > _ADMIN_VERIFY_MAX:
+            _ADMIN_VERIFY_CACHE.popitem(last=False)
+    return ok
 
-    return shell_pid, jobs, proc_map, children
 
 @app.post("/admin/login")
-async def admin_login(password: str = Form(...)):
+async def admin_login(password: str = Form(...), db: Session = Depends(get_db)):
     """Admin login backed by DB-stored bcrypt hash and lockout policy.
     Allow up to 5 failed attempts within a 1-hour window; on the 5th failure,
-    lock login for 1 hour.
+    lock login for 1 hour. DB round-trips run in worker threads.
     """
-    db = next(get_db())
-    try:
-        rec = db.query(AdminAuth).filter(AdminAuth.username == 'admin').first()
-        # If somehow missing, seed from env
-        if rec is None:
-            pw_hash = bcrypt.hashpw(ADMIN_PASSWORD.encode('utf-8'), bcrypt.gensalt(rounds=12)).decode('utf-8')
-            rec = AdminAuth(username='admin', password_hash=pw_hash, failed_count=0, window_start=None, locked_until=None)
-            db.add(rec)
-            db.commit()
-            db.refresh(rec)
-
-        now = datetime.utcnow()
-        if rec.locked_until and now < rec.locked_until:
-            minutes = max(1, int((rec.locked_until - now).total_seconds() // 60))
-            raise HTTPException(status_code=429, detail=f"Too many failed attempts. Try again in {minutes} minute(s).")
+    rec = await _get_admin_record(db)
 
-        ok = False
-        try:
-            ok = bcrypt.checkpw(password.encode('utf-8'), rec.password_hash.encode('utf-8'))
-        except Exception:
-            ok = False
-
-        if ok:
-            rec.failed_count = 0
-            rec.window_start = None
-            rec.locked_until = None
-            rec.updated_at = now
-            db.commit()
-            token = _issue_admin_token()
-            return {"token": token, "ttl_seconds": ADMIN_TOKEN_TTL}
-        else:
-            one_hour = timedelta(hours=1)
-            if (rec.window_start is None) or (now - rec.window_start > one_hour):
-                rec.window_start = now
-                rec.failed_count = 1
-            else:
-                rec.failed_count = (rec.failed_count or 0) + 1
-            if rec.failed_count >= 5:
-                rec.locked_until = now + one_hour
-            rec.updated_at = now
-            db.commit()
-            if rec.locked_until and now < rec.locked_until:
-                minutes = max(1, int((rec.locked_until - now).total_seconds() // 60))
-                raise HTTPException(status_code=429, detail=f"Account locked due to too many failed attempts. Try again in {minutes} minute(s).")
-            raise HTTPException(status_code=401, detail="Invalid password")
-    finally:
-        db.close()
+    now = datetime.utcnow()
+    if rec.locked_until and now < rec.locked_until:
+        minutes = max(1, int((rec.locked_until - now).total_seconds() // 60))
+        raise HTTPException(status_code=429, detail=f"Too many failed attempts. Try again in {minutes} minute(s).")
+
+    ok = await _verify_admin_password(password, rec.password_hash)
+
+    locked_until = await asyncio.to_thread(_record_admin_login, db, rec, ok, now)
+    if ok:
+        token = _issue_admin_token()
+        return {"token": token, "ttl_seconds": ADMIN_TOKEN_TTL}
+    if locked_until and now < locked_until:
+        minutes = max(1, int((locked_until - now).total_seconds() // 60))
+        raise HTTPException(status_code=429, detail=f"Account locked due to too many failed attempts. Try again in {minutes} minute(s).")
+    raise HTTPException(status_code=401, detail="Invalid password")
 
 @app.get("/admin/stats")
 async def admin_stats(x_admin_token: str | None = Header(default=None)):
     _validate_admin(x_admin_token)
-    return await _gather_admin_stats()
+    return await STATS_CACHE.get()
+
+
+def _load_user_records() -> list[dict]:
+    with _USER_RECORDS_LOCK:
+        gen = _USER_RECORDS_CACHE["gen"]
+        rows = _USER_RECORDS_CACHE["rows"]
+        if rows is not None and time.monotonic() - _USER_RECORDS_CACHE["at"] < USER_RECORDS_TTL:
+            return rows
+    with SessionLocal() as db:
+        # Column tuples, not ORM instances: no identity map or instrumented attribute access
+        result = db.execute(select(
+            UserContainer.username,
+            UserContainer.container_id,
+            UserContainer.session_id,
+            UserContainer.quota_bytes,
+        )).all()
+        rows = [
+            {
+                "username": username,
+                "container_id": container_id,
+                "session_id": session_id,
+                "quota_bytes": quota_bytes if quota_bytes is not None else 50 * 1024 * 1024,
+            }
+            for username, container_id, session_id, quota_bytes in result
+        ]
+    with _USER_RECORDS_LOCK:
+        if _USER_RECORDS_CACHE["gen"] == gen:
+            _USER_RECORDS_CACHE["rows"] = rows
+            _USER_RECORDS_CACHE["at"] = time.monotonic()
+    return rows
+
+
+@dataclass(slots=True)
+class UserStatsRow:
+    """Per-user admin stats row (wire shape of ``users[]`` in stats frames)."""
+    username: str
+    container_id: str
+    status: str
+    cpu_percent: float = 0.0
+    mem_usage: int = 0
+    mem_percent: float = 0.0
+    workspace_size: int = 0
+    quota_bytes: int = 50 * 1024 * 1024
+    shell_pid: int | None = None
+    jobs: list[JobRow] = field(default_factory=list)
+
+
+_USER_ROW_FIELDS = tuple(f.name for f in fields(UserStatsRow))
 
 
 async def _gather_admin_stats():
     """Aggregate per‑user container stats + jobs for admin HTTP / WS paths.
-    Fetch DB rows first, then close the session before running Docker calls.
+    Fetch DB rows first (in a worker thread), then run Docker calls without holding a session.
     """
-    db = next(get_db())
-    try:
-        users = db.query(UserContainer).all()
-        # Snapshot minimal fields to plain dicts so we can safely close the session
-        records = [
-            {
-                "username": u.username,
-                "container_id": u.container_id,
-                "session_id": getattr(u, 'session_id', None),
-                "quota_bytes": getattr(u, 'quota_bytes', 50 * 1024 * 1024),
-            }
-            for u in users
-        ]
-    finally:
-        db.close()
+    records = await asyncio.to_thread(_load_user_records)
 
-    user_rows = []
-    total_cpu = 0.0
-    total_mem_usage = 0
-    total_mem_limit = 0
-    for uc in records:
+    async def _workspace_size(session_id: str | None) -> int:
+        if not session_id:
+            return 0
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(SIZE_EXEC, _dir_size, os.path.join(BASE_WORKDIR_ABS, session_id))
+
+    async def _row_for(uc: dict):
+        """Build one user row; returns (row, cpu_percent, mem_usage, mem_limit) for the totals."""
+        quota_bytes = uc.get("quota_bytes", 50 * 1024 * 1024)
         try:
-            container = await asyncio.to_thread(client.containers.get, uc["container_id"]) 
-        except Exception:
-            user_rows.append({
-                "username": uc["username"],
-                "container_id": uc["container_id"],
-                "status": "missing",
-                "cpu_percent": 0.0,
-                "mem_usage": 0,
-                "mem_percent": 0.0,
-                "workspace_size": _dir_size(os.path.join(BASE_WORKDIR, uc.get("session_id"))) if uc.get("session_id") and os.path.exists(os.path.join(BASE_WORKDIR, uc.get("session_id"))) else 0,
-                "quota_bytes": uc.get("quota_bytes", 50 * 1024 * 1024),
-                "shell_pid": None,
-                "jobs": []
-            })
-            continue
+            container = await asyncio.to_thread(client.containers.get, uc["container_id"])
+        except Exception as e:
+            if isinstance(e, docker.errors.NotFound):
+                _remember_container_status(uc["container_id"], None)
+            row = UserStatsRow(
+                uc["username"], uc["container_id"], "missing",
+                workspace_size=await _workspace_size(uc.get("session_id")),
+                quota_bytes=quota_bytes,
+            )
+            return row, 0.0, 0, 0
+        _remember_container_status(container.id, container.status)
         cpu_percent, mem_usage, mem_limit, mem_percent, status = await _container_stats_safe(container)
-        total_cpu += cpu_percent
-        total_mem_usage += mem_usage
-        total_mem_limit += mem_limit
-        size = 0
-        if uc.get("session_id"):
-            workspace_dir = os.path.join(BASE_WORKDIR, uc["session_id"])
-            size = await asyncio.to_thread(_dir_size, workspace_dir) if os.path.exists(workspace_dir) else 0
+        size = await _workspace_size(uc.get("session_id"))
         shell_pid = None
-        jobs: list[dict[str, object]] = []
+        jobs: list[JobRow] = []
         if status == "running":
             try:
-                shell_pid, jobs, _, _ = await _collect_jobs(container, uc["username"], uc["container_id"]) 
+                shell_pid, jobs = await _collect_jobs(container, uc["username"], uc["container_id"])
             except Exception:
                 # Non-fatal; leave jobs empty
                 shell_pid = None
-        user_rows.append({
-            "username": uc["username"],
-            "container_id": uc["container_id"],
-            "status": status,
-            "cpu_percent": round(cpu_percent, 2),
-            "mem_usage": mem_usage,
-            "mem_percent": round(mem_percent, 2),
-            "workspace_size": size,
-            "quota_bytes": uc.get("quota_bytes", 50 * 1024 * 1024),
-            "shell_pid": shell_pid,
-            "jobs": jobs
-        })
+        row = UserStatsRow(
+            uc["username"], uc["container_id"], status,
+            cpu_percent=round(cpu_percent, 2),
+            mem_usage=mem_usage,
+            mem_percent=round(mem_percent, 2),
+            workspace_size=size,
+            quota_bytes=quota_bytes,
+            shell_pid=shell_pid,
+            jobs=jobs,
+        )
+        return row, cpu_percent, mem_usage, mem_limit
+
+    # Fan out per-user Docker work concurrently; blocking calls already run in worker threads
+    results = await asyncio.gather(*(_row_for(uc) for uc in records), return_exceptions=True)
+
+    user_rows = []
+    total_cpu = 0.0
+    total_mem_usage = 0
+    total_mem_limit = 0
+    for uc, result in zip(records, results):
+        if isinstance(result, BaseException):
+            user_rows.append(UserStatsRow(
+                uc["username"], uc["container_id"], "unknown",
+                quota_bytes=uc.get("quota_bytes", 50 * 1024 * 1024),
+            ))
+            continue
+        row, cpu_percent, mem_usage, mem_limit = result
+        total_cpu += cpu_percent
+        total_mem_usage += mem_usage
+        total_mem_limit += mem_limit
+        user_rows.append(row)
     overall = {
         "containers": len(records),
         "total_cpu_percent": round(total_cpu, 2),
@@ -618,13 +1130,104 @@ async def _gather_admin_stats():
     return {"overall": overall, "users": user_rows}
 
 
+class StatsCache:
+    """Single shared admin stats snapshot, refreshed by one background task.
+
+    All WS clients and REST callers read the same snapshot, so Docker/DB work per cycle is
+    O(users) regardless of how many admin tabs are open. The refresher starts on first use
+    and stops once no WS client is subscribed and no REST read happened for ``idle_timeout``.
+    """
+
+    def __init__(self, interval: float = 2.0, idle_timeout: float = 30.0):
+        self.interval = interval
+        self.idle_timeout = idle_timeout
+        self.snapshot: dict | None = None
+        self.error: str | None = None
+        self.updated_at = 0.0
+        self.version = 0
+        self.subscribers = 0
+        self._last_access = 0.0
+        self._cond = asyncio.Condition()
+        self._task: asyncio.Task | None = None
+
+    def _ensure_running(self):
+        self._last_access = time.monotonic()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._refresh_loop())
+
+    async def _refresh_loop(self):
+        while True:
+            snapshot, error = self.snapshot, None
+            try:
+                snapshot = await _gather_admin_stats()
+            except Exception as e:  # noqa: BLE001 keep refreshing; surface error to readers
+                print(f"[WS_STATS_ERROR] {e}")
+                error = str(e)
+            async with self._cond:
+                self.snapshot, self.error = snapshot, error
+                self.updated_at = time.monotonic()
+                self.version += 1
+                self._cond.notify_all()
+            if self.subscribers == 0 and time.monotonic() - self._last_access > self.idle_timeout:
+                return
+            await asyncio.sleep(self.interval)
+
+    async def wait_next(self, last_version: int):
+        """Wait for a snapshot newer than ``last_version``; returns (version, snapshot, error)."""
+        self._ensure_running()
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.version > last_version)
+            return self.version, self.snapshot, self.error
+
+    async def get(self) -> dict:
+        """Return the current snapshot, waiting for a refresh if it is older than one interval."""
+        self._ensure_running()
+        if self.snapshot is not None and self.error is None and time.monotonic() - self.updated_at < self.interval:
+            return self.snapshot
+        _, snapshot, error = await self.wait_next(self.version)
+        if error is not None or snapshot is None:
+            raise HTTPException(status_code=500, detail=f"Error gathering stats: {error}")
+        return snapshot
+
+
+STATS_CACHE = StatsCache()
+
+
+def _stats_delta(prev: dict, curr: dict) -> dict | None:
+    """Field-level diff between two stats snapshots (None when nothing moved).
+
+    ``changed`` holds full rows for new users and ``{"username", <changed fields>}`` patches
+    for existing ones; ``removed`` lists usernames that disappeared.
+    """
+    prev_rows = {row.username: row for row in prev["users"]}
+    changed = []
+    for row in curr["users"]:
+        old = prev_rows.pop(row.username, None)
+        if old is None:
+            changed.append(row)
+            continue
+        patch = {}
+        for name in _USER_ROW_FIELDS:
+            value = getattr(row, name)
+            if getattr(old, name) != value:
+                patch[name] = value
+        if patch:
+            patch["username"] = row.username
+            changed.append(patch)
+    removed = list(prev_rows)
+    if not changed and not removed and prev["overall"] == curr["overall"]:
+        return None
+    return {"type": "delta", "overall": curr["overall"], "changed": changed, "removed": removed}
+
+
 @app.websocket("/admin/ws/stats")
 async def admin_stats_ws(websocket: WebSocket):
     # Accept token via query ?token=... or header x-admin-token
     token = websocket.query_params.get("token") or websocket.headers.get("x-admin-token")
     print(f"[WS_STATS] Incoming connection token={token}")
     try:
-        _validate_admin(token)
+        # Validate once; afterwards only the expiry is checked per frame (no per-tick crypto)
+        expiry_ts = _validate_admin(token)
     except HTTPException:
         # Need to accept before close in FastAPI
         await websocket.accept()
@@ -633,111 +1236,107 @@ async def admin_stats_ws(websocket: WebSocket):
         return
     await websocket.accept()
     print(f"[WS_STATS] Authorized WebSocket token={token}")
-    update_interval = 2
+    version = 0
+    last_sent: dict | None = None  # snapshot this client has applied; later frames are deltas
+    STATS_CACHE.subscribers += 1
     try:
         while True:
-            try:
-                # Re-validate token (no silent refresh)
-                _validate_admin(token)
-                if websocket.application_state == WebSocketState.DISCONNECTED or websocket.client_state == WebSocketState.DISCONNECTED:
-                    break
-                data = await _gather_admin_stats()
-                try:
-                    await websocket.send_json(data)
-                except RuntimeError as re:  # Starlette raises if send after close
-                    if 'close message has been sent' in str(re):
-                        print("[WS_STATS] Suppressed send after close (graceful)")
-                        break
-                    raise
-            except HTTPException:
-                # Auth expired / invalid mid-stream
+            # Block until the shared refresher publishes a new snapshot
+            version, data, error = await STATS_CACHE.wait_next(version)
+            # Token expiry (no silent refresh)
+            if time.time() > expiry_ts:
                 await websocket.close(code=4401)
                 return
-            except Exception as e:  # noqa: BLE001 broad for resilience
-                # Log server-side for diagnostics
-                print(f"[WS_STATS_ERROR] {e}")
+            if websocket.application_state == WebSocketState.DISCONNECTED or websocket.client_state == WebSocketState.DISCONNECTED:
+                break
+            if error is not None:
                 # Attempt to notify client (non-fatal) – ignore if send fails
                 try:
-                    await websocket.send_json({"error": "stats_error", "detail": str(e)})
+                    await websocket.send_bytes(orjson.dumps({"error": "stats_error", "detail": error}))
                 except Exception:
                     pass
-            await asyncio.sleep(update_interval)
+                continue
+            if last_sent is None:
+                frame = {"type": "snapshot", **data}
+            else:
+                frame = _stats_delta(last_sent, data)
+                if frame is None:
+                    continue
+            try:
+                # orjson encodes straight to bytes in C; frames go out as binary
+                await websocket.send_bytes(orjson.dumps(frame))
+                last_sent = data
+            except RuntimeError as re:  # Starlette raises if send after close
+                if 'close message has been sent' in str(re):
+                    print("[WS_STATS] Suppressed send after close (graceful)")
+                    break
+                raise
     except (WebSocketDisconnect, asyncio.CancelledError):
         print("[WS_STATS] Client disconnected or server shutdown")
         return
+    except Exception as e:  # noqa: BLE001
+        print(f"[WS_STATS_ERROR] {e}")
+    finally:
+        STATS_CACHE.subscribers -= 1
 
 @app.post("/admin/stop-user")
-async def admin_stop_user(username: str = Form(...), x_admin_token: str | None = Header(default=None)):
+async def admin_stop_user(username: str = Form(...), x_admin_token: str | None = Header(default=None), db: Session = Depends(get_db)):
     _validate_admin(x_admin_token)
-    db = next(get_db())
-    try:
-        uc = get_user_container(db, username)
-        if not uc:
-            raise HTTPException(status_code=404, detail="User not found")
+    uc = await asyncio.to_thread(get_user_container, db, username)
+    if not uc:
+        raise HTTPException(status_code=404, detail="User not found")
     # Attempt container removal
+    _close_terminal_session(username)
+    try:
+        await asyncio.to_thread(_stop_and_remove_container, uc.container_id)
+    except docker.errors.NotFound:
+        pass
+    except Exception as e:
+        print(f"Admin stop warning for {username}: {e}")
+    # Delete workspace directory (prefer session-based directory)
+    user_dir = os.path.join(BASE_WORKDIR_ABS, getattr(uc, 'session_id', None) or username)
+    if os.path.exists(user_dir):
         try:
-            container = await asyncio.to_thread(client.containers.get, uc.container_id)
-            await asyncio.to_thread(container.stop)
-            await asyncio.to_thread(container.remove)
-        except docker.errors.NotFound:
-            pass
+            await asyncio.to_thread(_fast_rmtree, user_dir)
         except Exception as e:
-            print(f"Admin stop warning for {username}: {e}")
-    # Delete workspace directory
-        # Prefer session-based directory if record exists
-        sess_based = None
-        try:
-            uc_rec = get_user_container(db, username)
-            sess_based = getattr(uc_rec, 'session_id', None)
-        except Exception:
-            sess_based = None
-        user_dir = os.path.join(BASE_WORKDIR, sess_based or username)
-        if os.path.exists(user_dir):
-            try:
-                shutil.rmtree(user_dir)
-            except Exception as e:
-                print(f"Admin delete dir warning for {username}: {e}")
-        delete_user_container(db, username)
-        async with SHELL_PIDS_LOCK:
-            SHELL_PIDS.pop(username, None)
-        return {"message": f"User {username} resources removed"}
-    finally:
-        db.close()
+            print(f"Admin delete dir warning for {username}: {e}")
+    _invalidate_dir_size(user_dir)
+    _forget_workspace_usage(user_dir)
+    await asyncio.to_thread(_drop_zip_cache, getattr(uc, 'session_id', None))
+    await asyncio.to_thread(delete_user_container, db, username)
+    SHELL_PIDS.pop(username, None)
+    return {"message": f"User {username} resources removed"}
+
+
+def _list_user_summaries(db: Session) -> list[dict]:
+    rows = db.execute(select(UserContainer.username, UserContainer.container_id, UserContainer.created_at, UserContainer.quota_bytes)).all()
+    return [{"username": username, "container_id": container_id, "created_at": created_at.isoformat(), "quota_bytes": quota_bytes if quota_bytes is not None else 50*1024*1024} for username, container_id, created_at, quota_bytes in rows]
 
 @app.get("/admin/list-users")
-async def admin_list_users(x_admin_token: str | None = Header(default=None)):
+async def admin_list_users(x_admin_token: str | None = Header(default=None), db: Session = Depends(get_db)):
     _validate_admin(x_admin_token)
-    db = next(get_db())
-    try:
-        users = db.query(UserContainer).all()
-        return {"users": [{"username": u.username, "container_id": u.container_id, "created_at": u.created_at.isoformat(), "quota_bytes": getattr(u,'quota_bytes', 50*1024*1024)} for u in users]}
-    finally:
-        db.close()
+    return {"users": await asyncio.to_thread(_list_user_summaries, db)}
 
 
 @app.get("/admin/jobs")
-async def admin_list_jobs(username: str, x_admin_token: str | None = Header(default=None)):
+async def admin_list_jobs(username: str, x_admin_token: str | None = Header(default=None), db: Session = Depends(get_db)):
     _validate_admin(x_admin_token)
-    db = next(get_db())
+    uc = await asyncio.to_thread(get_user_container, db, username)
+    if not uc:
+        raise HTTPException(status_code=404, detail="User not found")
     try:
-        uc = get_user_container(db, username)
-        if not uc:
-            raise HTTPException(status_code=404, detail="User not found")
-        try:
-            container = await asyncio.to_thread(client.containers.get, uc.container_id)
-        except docker.errors.NotFound:
-            raise HTTPException(status_code=404, detail="Container not found")
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Error accessing container: {e}") from e
+        container = await asyncio.to_thread(client.containers.get, uc.container_id)
+    except docker.errors.NotFound:
+        raise HTTPException(status_code=404, detail="Container not found")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error accessing container: {e}") from e
 
-        shell_pid, jobs, _, _ = await _collect_jobs(container, username, uc.container_id)
-        return {
-            "username": username,
-            "shell_pid": shell_pid,
-            "jobs": jobs
-        }
-    finally:
-        db.close()
+    shell_pid, jobs = await _collect_jobs(container, username, uc.container_id)
+    return {
+        "username": username,
+        "shell_pid": shell_pid,
+        "jobs": jobs
+    }
 
 
 @app.post("/admin/kill-job")
@@ -746,7 +1345,8 @@ async def admin_kill_job(
     username: str = Form(...),
     pid: int = Form(...),
     signal_name: str = Form("TERM"),
-    x_admin_token: str | None = Header(default=None)
+    x_admin_token: str | None = Header(default=None),
+    db: Session = Depends(get_db),
 ):
     """Schedule a signal to a user process (non-blocking)."""
     _validate_admin(x_admin_token)
@@ -754,64 +1354,77 @@ async def admin_kill_job(
     sig = signal_name.upper()
     if sig not in allowed_signals:
         raise HTTPException(status_code=400, detail=f"Unsupported signal {signal_name}")
-    db = next(get_db())
+    uc = await asyncio.to_thread(get_user_container, db, username)
+    if not uc:
+        raise HTTPException(status_code=404, detail="User not found")
     try:
-        uc = get_user_container(db, username)
-        if not uc:
-            raise HTTPException(status_code=404, detail="User not found")
-        try:
-            container = await asyncio.to_thread(client.containers.get, uc.container_id)
-        except docker.errors.NotFound:
-            raise HTTPException(status_code=404, detail="Container not found")
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Error accessing container: {e}") from e
+        container = await asyncio.to_thread(client.containers.get, uc.container_id)
+    except docker.errors.NotFound:
+        raise HTTPException(status_code=404, detail="Container not found")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error accessing container: {e}") from e
 
-        shell_pid, jobs, _, _ = await _collect_jobs(container, username, uc.container_id)
-        if not shell_pid:
-            raise HTTPException(status_code=404, detail="User terminal inactive")
-        valid_pids = {job["pid"] for job in jobs}
-        if pid not in valid_pids:
-            raise HTTPException(status_code=404, detail="Process not found or not shell-managed")
+    shell_pid, jobs = await _collect_jobs(container, username, uc.container_id)
+    if not shell_pid:
+        raise HTTPException(status_code=404, detail="User terminal inactive")
+    valid_pids = {job.pid for job in jobs}
+    if pid not in valid_pids:
+        raise HTTPException(status_code=404, detail="Process not found or not shell-managed")
 
-        kill_cmd = f"kill -s {sig} {pid} 2>/dev/null || kill -{sig} {pid} 2>/dev/null"
+    # procps kill exec'd directly (same package as the ps used above): no shell per signal
+    kill_cmd = ["kill", "-s", sig, str(pid)]
 
-        def _do_kill(container_id: str, cmd: str):  # runs in thread via BackgroundTasks
-            try:
-                cont = client.containers.get(container_id)
-                cont.exec_run(["bash", "-lc", cmd], demux=False)
-            except Exception as e:  # noqa: BLE001
-                print(f"[KILL_JOB_WARN] Failed to send signal {sig} to {pid} in {container_id}: {e}")
+    def _do_kill(container_id: str, cmd: list[str]):  # runs in thread via BackgroundTasks
+        try:
+            # Detached start returns once the exec is launched instead of holding the API
+            # connection open until kill exits
+            exec_id = client.api.exec_create(container_id, cmd, stdout=False, stderr=False)["Id"]
+            client.api.exec_start(exec_id, detach=True)
+        except Exception as e:  # noqa: BLE001
+            logger.warning("[KILL_JOB_WARN] Failed to send signal %s to %s in %s: %s", sig, pid, container_id, e)
+
+    background_tasks.add_task(_do_kill, uc.container_id, kill_cmd)
+    return {"message": f"Signal SIG{sig} scheduled for PID {pid}", "pid": pid, "signal": sig, "scheduled": True}
+
+
+def _set_user_quota(db: Session, username: str, bytes_val: int) -> bool:
+    uc = get_user_container(db, username)
+    if not uc:
+        return False
+    setattr(uc, 'quota_bytes', bytes_val)
+    uc.updated_at = datetime.utcnow()
+    db.commit()
+    _invalidate_user_records()
+    return True
 
-        background_tasks.add_task(_do_kill, uc.container_id, kill_cmd)
-        return {"message": f"Signal SIG{sig} scheduled for PID {pid}", "pid": pid, "signal": sig, "scheduled": True}
-    finally:
-        db.close()
 
 @app.post("/admin/set-quota")
-async def admin_set_quota(username: str = Form(...), quota_mb: int = Form(...), x_admin_token: str | None = Header(default=None)):
+async def admin_set_quota(username: str = Form(...), quota_mb: int = Form(...), x_admin_token: str | None = Header(default=None), db: Session = Depends(get_db)):
     """Set a user's storage quota (in MB). Minimum 50MB."""
     _validate_admin(x_admin_token)
     if quota_mb < 50:
-        raise HTTPException(status_code=400, detail="Minimum quota is 50MB")
-    db = next(get_db())
-    try:
-        uc = get_user_container(db, username)
-        if not uc:
-            raise HTTPException(status_code=404, detail="User not found")
-        bytes_val = quota_mb * 1024 * 1024
-        setattr(uc, 'quota_bytes', bytes_val)
-        uc.updated_at = datetime.utcnow()
-        db.commit()
-        return {"message": f"Quota updated to {quota_mb}MB", "quota_bytes": bytes_val}
-    finally:
-        db.close()
+        raise HTTPException(status_code=400, detail="Minimum quota is 50MB")
+    bytes_val = quota_mb * 1024 * 1024
+    if not await asyncio.to_thread(_set_user_quota, db, username, bytes_val):
+        raise HTTPException(status_code=404, detail="User not found")
+    return {"message": f"Quota updated to {quota_mb}MB", "quota_bytes": bytes_val}
+
+
+def _store_admin_password(db: Session, record: AdminAuth, new_hash: str):
+    record.password_hash = new_hash
+    record.failed_count = 0
+    record.window_start = None
+    record.locked_until = None
+    record.updated_at = datetime.utcnow()
+    db.commit()
 
 
 @app.post("/admin/change-password")
 async def admin_change_password(
     current_password: str = Form(...),
     new_password: str = Form(...),
-    x_admin_token: str | None = Header(default=None)
+    x_admin_token: str | None = Header(default=None),
+    db: Session = Depends(get_db),
 ):
     """Update the admin password after verifying the current password."""
     _validate_admin(x_admin_token)
@@ -821,66 +1434,45 @@ async def admin_change_password(
     if new_password.lower().strip() in {"password", "admin", "admin123"}:
         raise HTTPException(status_code=400, detail="Choose a stronger password")
 
-    db = next(get_db())
-    try:
-        record = db.query(AdminAuth).filter(AdminAuth.username == 'admin').first()
-        if record is None:
-            raise HTTPException(status_code=500, detail="Admin credentials not provisioned")
-        if not bcrypt.checkpw(current_password.encode('utf-8'), record.password_hash.encode('utf-8')):
-            raise HTTPException(status_code=401, detail="Current password is incorrect")
-        if bcrypt.checkpw(new_password.encode('utf-8'), record.password_hash.encode('utf-8')):
-            raise HTTPException(status_code=400, detail="New password must be different")
-
-        new_hash = bcrypt.hashpw(new_password.encode('utf-8'), bcrypt.gensalt(rounds=12)).decode('utf-8')
-        record.password_hash = new_hash
-        record.failed_count = 0
-        record.window_start = None
-        record.locked_until = None
-        record.updated_at = datetime.utcnow()
-        db.commit()
-        return {"message": "Password updated successfully"}
-    finally:
-        db.close()
+    record = await asyncio.to_thread(_query_admin_record, db)
+    if record is None:
+        raise HTTPException(status_code=500, detail="Admin credentials not provisioned")
+    current_hash = record.password_hash.encode('utf-8')
+    if not await _bcrypt(bcrypt.checkpw, current_password.encode('utf-8'), current_hash):
+        raise HTTPException(status_code=401, detail="Current password is incorrect")
+    if await _bcrypt(bcrypt.checkpw, new_password.encode('utf-8'), current_hash):
+        raise HTTPException(status_code=400, detail="New password must be different")
+
+    new_hash = await _bcrypt(bcrypt.hashpw, new_password.encode('utf-8'), bcrypt.gensalt(rounds=12))
+    await asyncio.to_thread(_store_admin_password, db, record, new_hash.decode('utf-8'))
+    return {"message": "Password updated successfully"}
 
 
 @app.get("/quota-usage/{username}")
-async def quota_usage(username: str):
+async def quota_usage(username: str, workspace: tuple[UserRecord, str] = Depends(require_active_workspace)):
     """Return storage usage & quota (frontend friendly)."""
-    db = next(get_db())
-    try:
-        user_container = get_user_container(db, username)
-        if not user_container:
-            raise HTTPException(status_code=404, detail="User not logged in")
-        if not getattr(user_container, 'session_id', None):
-            raise HTTPException(status_code=409, detail="No active session. Please login/start container again")
-        user_workdir = os.path.join(BASE_WORKDIR, user_container.session_id)
-        used = _dir_size(user_workdir) if os.path.exists(user_workdir) else 0
-        quota_bytes = getattr(user_container, 'quota_bytes', 50 * 1024 * 1024)
-        percent = (used / quota_bytes * 100.0) if quota_bytes > 0 else 0.0
-        return {
-            "username": username,
-            "used_bytes": used,
-            "quota_bytes": quota_bytes,
-            "percent_used": round(percent, 2)
-        }
-    finally:
-        db.close()
+    user_container, user_workdir = workspace
+    used = _workspace_usage(user_workdir)
+    quota_bytes = getattr(user_container, 'quota_bytes', 50 * 1024 * 1024)
+    percent = (used / quota_bytes * 100.0) if quota_bytes > 0 else 0.0
+    return {
+        "username": username,
+        "used_bytes": used,
+        "quota_bytes": quota_bytes,
+        "percent_used": round(percent, 2)
+    }
 
 @app.post("/auth")
-async def auth(username: str = Form(...)):
+async def auth(username: str = Form(...), db: Session = Depends(get_db)):
     """Auth only; does NOT start container. Returns presence / running info."""
     # Do NOT create the user directory here; defer until container start so no files/dirs exist pre-image selection
     if not username or not username.strip():
         raise HTTPException(status_code=400, detail="Invalid username")
 
     uname = username.strip()
-    # Acquire DB only to fetch the record, then release immediately to avoid holding a pool slot
-    existing = None
-    db = next(get_db())
-    try:
-        existing = get_user_container(db, uname)
-    finally:
-        db.close()
+    # Fetch the record, then release the connection before the Docker round-trip
+    existing = get_user_container(db, uname)
+    db.close()
 
     container_running = False
     container_id = None
@@ -888,12 +1480,7 @@ async def auth(username: str = Form(...)):
         container_id = existing.container_id
         # Check if container actually running (offloaded)
         try:
-            container = await asyncio.to_thread(client.containers.get, existing.container_id)
-            await asyncio.to_thread(container.reload)
-            if container.status == "running":
-                container_running = True
-        except docker.errors.NotFound:
-            pass
+            container_running = await get_container_status(existing.container_id) == "running"
         except Exception as e:
             # Log and continue without failing auth
             print(f"Auth check warning for {uname}: {e}")
@@ -906,30 +1493,26 @@ async def auth(username: str = Form(...)):
 
 
 @app.post("/login")
-async def login(username: str = Form(...)):
+async def login(username: str = Form(...), db: Session = Depends(get_db)):
     """Start container if absent or stopped (legacy entrypoint)."""
-    db = next(get_db())
-    
     try:
         # Check if user already has a container
         existing_user = get_user_container(db, username)
         if existing_user:
             # Check if container is still running (offload docker SDK calls)
             try:
-                container = await asyncio.to_thread(client.containers.get, existing_user.container_id)
-                # docker-py container.status may be stale; call reload in thread
-                await asyncio.to_thread(container.reload)
-                if container.status == "running":
+                status = await get_container_status(existing_user.container_id)
+                if status == "running":
                     return {"message": f"Container already running for {username}", "container_id": existing_user.container_id, "session_id": getattr(existing_user, 'session_id', None)}
-                else:
+                elif status is not None:
                     # Container exists but not running, remove it and create new one
-                    await asyncio.to_thread(container.remove, True)
+                    await asyncio.to_thread(_stop_and_remove_container, existing_user.container_id)
             except docker.errors.NotFound:
                 # Container not found, will create new one
                 pass
         # Determine session directory (use existing session_id if present, else create new)
-        session_id = getattr(existing_user, 'session_id', None) if existing_user else uuid.uuid4().hex
-        user_workdir = os.path.join(BASE_WORKDIR, session_id)
+        session_id = getattr(existing_user, 'session_id', None) if existing_user else secrets.token_hex(16)
+        user_workdir = os.path.join(BASE_WORKDIR_ABS, session_id)
         os.makedirs(user_workdir, exist_ok=True)
 
         container = await asyncio.to_thread(
@@ -937,7 +1520,7 @@ async def login(username: str = Form(...)):
             "mini-colab",
             tty=True,
             stdin_open=True,
-            volumes={os.path.abspath(user_workdir): {"bind": "/app", "mode": "rw"}},
+            volumes={user_workdir: {"bind": "/app", "mode": "rw"}},
             detach=True,
         )
 
@@ -953,80 +1536,94 @@ async def login(username: str = Form(...)):
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error starting container: {str(e)}")
-    finally:
-        db.close()
+
+
+# Common OCI / label-schema / generic keys, checked in order
+_IMAGE_DESCRIPTION_KEYS = (
+    'org.opencontainers.image.description',
+    'description',
+    'org.label-schema.description',
+    'summary',
+)
+_IMAGE_TITLE_KEYS = (
+    'org.opencontainers.image.title',
+    'org.label-schema.name',
+    'name',
+)
+
+
+def _derive_image_description(lbls: dict) -> str | None:
+    if not lbls:
+        return None
+    for k in _IMAGE_DESCRIPTION_KEYS:
+        if k in lbls and lbls[k]:
+            return str(lbls[k])[:280]
+    # Fallback: combine title + version if available
+    title = None
+    for k in _IMAGE_TITLE_KEYS:
+        if k in lbls and lbls[k]:
+            title = lbls[k]
+            break
+    version = lbls.get('org.opencontainers.image.version') or lbls.get('version')
+    if title and version:
+        return f"{title} (version {version})"
+    return title
+
+
+# Local image inventory changes rarely (build/pull/rmi); serve the serialized list for
+# IMAGES_CACHE_TTL seconds instead of listing + inspecting every image per request.
+IMAGES_CACHE_TTL = 15.0
+_IMAGES_CACHE: dict = {"at": 0.0, "images": None}
+
+
+def _list_images_info() -> list[dict]:
+    images_info = []
+    for img in client.images.list():
+        tags = img.tags or ["<none>:<none>"]
+        tag = tags[0]
+        # docker-py sometimes exposes labels in attrs.Config.Labels or via .labels
+        labels = None
+        try:
+            labels = getattr(img, 'labels', None) or img.attrs.get('Config', {}).get('Labels') or {}
+        except Exception:
+            labels = {}
+        description = _derive_image_description(labels) if labels else None
+        images_info.append({
+            "tag": tag,
+            "id": img.short_id.split(":")[1] if ":" in img.short_id else img.short_id,
+            "size": getattr(img, 'attrs', {}).get('Size', None),
+            "description": description,
+            "labels": labels or {}
+        })
+    images_info.sort(key=lambda x: x["tag"])  # deterministic order
+    return images_info
 
 
 @app.get("/images")
 async def list_images():
     """List local Docker images (first tag + size + derived description)."""
+    cached = _IMAGES_CACHE["images"]
+    if cached is not None and time.monotonic() - _IMAGES_CACHE["at"] < IMAGES_CACHE_TTL:
+        return {"images": cached}
     try:
-        images_info = []
-        images = await asyncio.to_thread(client.images.list)
-
-        def derive_description(lbls: dict) -> str | None:
-            if not lbls:
-                return None
-            # Common OCI / label-schema / generic keys
-            preferred_keys = [
-                'org.opencontainers.image.description',
-                'description',
-                'org.label-schema.description',
-                'summary',
-            ]
-            for k in preferred_keys:
-                if k in lbls and lbls[k]:
-                    return str(lbls[k])[:280]
-            # Fallback: combine title + version if available
-            title_keys = [
-                'org.opencontainers.image.title',
-                'org.label-schema.name',
-                'name'
-            ]
-            title = None
-            for k in title_keys:
-                if k in lbls and lbls[k]:
-                    title = lbls[k]
-                    break
-            version = lbls.get('org.opencontainers.image.version') or lbls.get('version')
-            if title and version:
-                return f"{title} (version {version})"
-            return title
-
-        for img in images:
-            tags = img.tags or ["<none>:<none>"]
-            tag = tags[0]
-            # docker-py sometimes exposes labels in attrs.Config.Labels or via .labels
-            labels = None
-            try:
-                labels = getattr(img, 'labels', None) or img.attrs.get('Config', {}).get('Labels') or {}
-            except Exception:
-                labels = {}
-            description = derive_description(labels) if labels else None
-            images_info.append({
-                "tag": tag,
-                "id": img.short_id.split(":")[1] if ":" in img.short_id else img.short_id,
-                "size": getattr(img, 'attrs', {}).get('Size', None),
-                "description": description,
-                "labels": labels or {}
-            })
-        images_info.sort(key=lambda x: x["tag"])  # deterministic order
-        return {"images": images_info}
+        images_info = await asyncio.to_thread(_list_images_info)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error listing images: {e}")
+    _IMAGES_CACHE["images"] = images_info
+    _IMAGES_CACHE["at"] = time.monotonic()
+    return {"images": images_info}
 
 
 @app.post("/start-container")
-async def start_container(username: str = Form(...), image: str = Form(...)):
+async def start_container(username: str = Form(...), image: str = Form(...), db: Session = Depends(get_db)):
     """Start (or replace) user container with selected image."""
-    db = next(get_db())
     try:
         existing_user = get_user_container(db, username)
         # Remove existing container if present (allow switching images)
         if existing_user:
             try:
-                old_container = await asyncio.to_thread(client.containers.get, existing_user.container_id)
-                await asyncio.to_thread(old_container.remove, True)
+                # Force-remove by id in one API call (no separate inspect)
+                await asyncio.to_thread(_stop_and_remove_container, existing_user.container_id)
             except docker.errors.NotFound:
                 pass
             except Exception as e:
@@ -1034,8 +1631,8 @@ async def start_container(username: str = Form(...), image: str = Form(...)):
                 print(f"Warning removing old container for {username}: {e}")
 
         # Determine session directory (use existing session_id if present, else create new)
-        session_id = getattr(existing_user, 'session_id', None) if existing_user else uuid.uuid4().hex
-        user_workdir = os.path.join(BASE_WORKDIR, session_id)
+        session_id = getattr(existing_user, 'session_id', None) if existing_user else secrets.token_hex(16)
+        user_workdir = os.path.join(BASE_WORKDIR_ABS, session_id)
         os.makedirs(user_workdir, exist_ok=True)
 
         try:
@@ -1044,10 +1641,11 @@ async def start_container(username: str = Form(...), image: str = Form(...)):
                 image,
                 tty=True,
                 stdin_open=True,
-                volumes={os.path.abspath(user_workdir): {"bind": "/app", "mode": "rw"}},
+                volumes={user_workdir: {"bind": "/app", "mode": "rw"}},
                 detach=True,
             )
         except docker.errors.ImageNotFound:
+            _IMAGES_CACHE["images"] = None  # listed image was removed; refresh on next /images
             raise HTTPException(status_code=404, detail=f"Image not found: {image}")
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Error starting container from {image}: {e}")
@@ -1060,30 +1658,22 @@ async def start_container(username: str = Form(...), image: str = Form(...)):
         return {"message": f"Container started for {username} using {image}", "container_id": container.id, "image": image, "session_id": getattr(db_obj, 'session_id', session_id)}
     except SQLAlchemyError as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
-    finally:
-        db.close()
 
 
 @app.post("/save-file")
-async def save_file(username: str = Form(...), filename: str = Form(...), code: str = Form(...)):
+async def save_file(username: str = Form(...), filename: str = Form(...), code: str = Form(...), workspace: tuple[UserRecord, str] = Depends(require_active_workspace_form)):
     """Persist file content with quota enforcement (normalized newlines)."""
-    db = next(get_db())
-    
     try:
-        # Check if user is logged in
-        user_container = get_user_container(db, username)
-        if not user_container:
-            raise HTTPException(status_code=404, detail="User not logged in")
-
-        # Save code to user's directory
-        user_workdir = os.path.join(BASE_WORKDIR, getattr(user_container, 'session_id', None) or username)
+        user_container, user_workdir = workspace
         os.makedirs(user_workdir, exist_ok=True)
         
-        # Normalize line endings to prevent doubling
-        # Replace \r\n with \n, then \r with \n to normalize all line endings
-        normalized_code = code.replace('\r\n', '\n').replace('\r', '\n')
+        # Normalize line endings to prevent doubling (\r\n and lone \r -> \n); LF-only input,
+        # the common case, is detected with one scan and passed through without copying
+        normalized_code = code.replace('\r\n', '\n').replace('\r', '\n') if '\r' in code else code
         
         filepath = os.path.join(user_workdir, filename)
+        if not _within_workdir(filepath, user_workdir):
+            raise HTTPException(status_code=400, detail="Invalid file path")
         # Quota enforcement (estimate delta)
         existing_size = 0
         if os.path.exists(filepath):
@@ -1091,19 +1681,24 @@ async def save_file(username: str = Form(...), filename: str = Form(...), code:
                 existing_size = os.path.getsize(filepath)
             except OSError:
                 existing_size = 0
-        new_size = len(normalized_code.encode('utf-8'))
+        # Encode once: the bytes size the quota delta and are written as-is below
+        encoded = normalized_code.encode('utf-8')
+        new_size = len(encoded)
         delta = new_size - existing_size
         # Only check if growing
         if delta > 0:
             # Get quota
             quota_bytes = getattr(user_container, 'quota_bytes', 50 * 1024 * 1024)
-            current_total = _dir_size(user_workdir)
-            if current_total + delta > quota_bytes:
+            if _workspace_usage(user_workdir) + delta > quota_bytes:
                 raise HTTPException(status_code=403, detail=f"Quota exceeded. Limit {quota_bytes} bytes")
         def _write():
-            with open(filepath, "w", encoding="utf-8", newline='\n') as f:
-                f.write(normalized_code)
+            # Binary mode on pre-encoded bytes: no text layer; BufferedWriter hands a payload larger
+            # than its buffer straight to the OS and retries short writes (raw FileIO would not)
+            with open(filepath, "wb") as f:
+                f.write(encoded)
         await asyncio.to_thread(_write)
+        _invalidate_dir_size(os.path.dirname(filepath))
+        _adjust_workspace_usage(user_workdir, delta)
 
         return {"message": f"File {filename} saved successfully"}
     
@@ -1111,105 +1706,86 @@ async def save_file(username: str = Form(...), filename: str = Form(...), code:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error saving file: {str(e)}")
-    finally:
-        db.close()
 
 
-@app.get("/files/{username}")
-async def list_files(username: str):
-    """List workspace file tree (recursive)."""
-    db = next(get_db())
-    
+def _build_file_tree(directory: str, relative_path: str = "") -> list[dict]:
+    """One scandir pass per directory; DirEntry's cached type/stat avoid per-entry isdir/getsize.
+    Entries come back in directory order (the explorer sorts client-side)."""
+    items = []
     try:
-        # Check if user is logged in
-        user_container = get_user_container(db, username)
-        if not user_container:
-            raise HTTPException(status_code=404, detail="User not logged in")
-        if not getattr(user_container, 'session_id', None):
-            raise HTTPException(status_code=409, detail="No active session. Please login/start container again")
-        user_workdir = os.path.join(BASE_WORKDIR, user_container.session_id)
-        if not os.path.exists(user_workdir):
-            os.makedirs(user_workdir, exist_ok=True)
-            return {"files": []}
-
-        def build_file_tree(directory, relative_path=""):
-            items = []
-            try:
-                for item in sorted(os.listdir(directory)):
-                    item_path = os.path.join(directory, item)
-                    relative_item_path = os.path.join(relative_path, item).replace("\\", "/")
-                    
-                    if os.path.isdir(item_path):
-                        folder_item = {
-                            "name": item,
+        with os.scandir(directory) as it:
+            for entry in it:
+                relative_item_path = f"{relative_path}/{entry.name}" if relative_path else entry.name
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        items.append({
+                            "name": entry.name,
                             "type": "folder",
                             "path": relative_item_path,
-                            "children": build_file_tree(item_path, relative_item_path)
-                        }
-                        items.append(folder_item)
+                            "children": _build_file_tree(entry.path, relative_item_path),
+                        })
                     else:
-                        file_item = {
-                            "name": item,
+                        items.append({
+                            "name": entry.name,
                             "type": "file",
                             "path": relative_item_path,
-                            "size": os.path.getsize(item_path)
-                        }
-                        items.append(file_item)
-            except PermissionError:
-                pass
-            
-            return items
+                            "size": entry.stat(follow_symlinks=False).st_size,
+                        })
+                except OSError:
+                    continue
+    except OSError:
+        pass
+    return items
+
+
+@app.get("/files/{username}")
+async def list_files(username: str, workspace: tuple[UserRecord, str] = Depends(require_active_workspace)):
+    """List workspace file tree (recursive)."""
+    try:
+        _, user_workdir = workspace
+        if not os.path.exists(user_workdir):
+            os.makedirs(user_workdir, exist_ok=True)
+            return {"files": []}
 
-        files = build_file_tree(user_workdir)
+        files = await asyncio.to_thread(_build_file_tree, user_workdir)
         return {"files": files}
     
     except SQLAlchemyError as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error listing files: {str(e)}")
-    finally:
-        db.close()
 
 
 @app.post("/create-file")
-async def create_file(username: str = Form(...), filepath: str = Form(...), file_type: str = Form(...)):
+async def create_file(username: str = Form(...), filepath: str = Form(...), file_type: str = Form(...), workspace: tuple[UserRecord, str] = Depends(require_active_workspace_form)):
     """Create empty file or folder (path normalized)."""
-    db = next(get_db())
-    
     try:
-        # Check if user is logged in
-        user_container = get_user_container(db, username)
-        if not user_container:
-            raise HTTPException(status_code=404, detail="User not logged in")
-        if not getattr(user_container, 'session_id', None):
-            raise HTTPException(status_code=409, detail="No active session. Please login/start container again")
-        user_workdir = os.path.join(BASE_WORKDIR, user_container.session_id)
+        _, user_workdir = workspace
         # Normalize to forward slashes and strip leading slash
         safe_rel = filepath.replace("\\", "/").lstrip("/")
         full_path = os.path.join(user_workdir, safe_rel)
         
         # Security check: ensure path is within user directory
-        if not os.path.abspath(full_path).startswith(os.path.abspath(user_workdir)):
+        if not _within_workdir(full_path, user_workdir):
             raise HTTPException(status_code=400, detail="Invalid file path")
 
         # Prevent overwriting existing entries (match VS Code behavior)
         if os.path.exists(full_path):
             raise HTTPException(status_code=409, detail="File or folder already exists")
 
+        _invalidate_dir_size(os.path.dirname(full_path))
         if file_type == "folder":
-            os.makedirs(full_path, exist_ok=False)
+            await asyncio.to_thread(os.makedirs, full_path, exist_ok=False)
             return {"message": f"Folder created: {filepath}"}
         else:
-            # Create parent directories if they don't exist
-            parent_dir = os.path.dirname(full_path)
-            os.makedirs(parent_dir, exist_ok=True)
-
-            # Create empty file (fail if file unexpectedly appears between checks)
-            flags = os.O_CREAT | os.O_EXCL | os.O_WRONLY
+            def _create_empty():
+                # Create parent directories if they don't exist
+                os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                # Create empty file (fail if file unexpectedly appears between checks)
+                fd = os.open(full_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                os.close(fd)
             try:
-                fd = os.open(full_path, flags)
-                with os.fdopen(fd, "w", encoding="utf-8") as f:
-                    f.write("")
+                await asyncio.to_thread(_create_empty)
             except FileExistsError:
                 raise HTTPException(status_code=409, detail="File already exists")
             return {"message": f"File created: {filepath}"}
@@ -1218,29 +1794,19 @@ async def create_file(username: str = Form(...), filepath: str = Form(...), file
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error creating {file_type}: {str(e)}")
-    finally:
-        db.close()
 
 
 @app.post("/rename-file")
-async def rename_file(username: str = Form(...), old_path: str = Form(...), new_path: str = Form(...)):
+async def rename_file(username: str = Form(...), old_path: str = Form(...), new_path: str = Form(...), workspace: tuple[UserRecord, str] = Depends(require_active_workspace_form)):
     """Rename file / folder (safe path checks)."""
-    db = next(get_db())
-    
     try:
-        # Check if user is logged in
-        user_container = get_user_container(db, username)
-        if not user_container:
-            raise HTTPException(status_code=404, detail="User not logged in")
-        if not getattr(user_container, 'session_id', None):
-            raise HTTPException(status_code=409, detail="No active session. Please login/start container again")
-        user_workdir = os.path.join(BASE_WORKDIR, user_container.session_id)
+        record, user_workdir = workspace
         old_full_path = os.path.join(user_workdir, old_path.lstrip("/"))
         new_full_path = os.path.join(user_workdir, new_path.lstrip("/"))
         
         # Security check: ensure paths are within user directory
-        if not (os.path.abspath(old_full_path).startswith(os.path.abspath(user_workdir)) and 
-                os.path.abspath(new_full_path).startswith(os.path.abspath(user_workdir))):
+        if not (_within_workdir(old_full_path, user_workdir, follow_symlinks=False) and
+                _within_workdir(new_full_path, user_workdir, follow_symlinks=False)):
             raise HTTPException(status_code=400, detail="Invalid file path")
 
         if not os.path.exists(old_full_path):
@@ -1249,75 +1815,89 @@ async def rename_file(username: str = Form(...), old_path: str = Form(...), new_
         if os.path.exists(new_full_path):
             raise HTTPException(status_code=400, detail="File or folder already exists")
 
-        os.rename(old_full_path, new_full_path)
+        await asyncio.to_thread(os.rename, old_full_path, new_full_path)
+        _invalidate_dir_size(old_full_path)
+        _invalidate_dir_size(os.path.dirname(old_full_path))
+        _invalidate_dir_size(os.path.dirname(new_full_path))
+        if os.path.isdir(new_full_path) and not os.path.islink(new_full_path):
+            await asyncio.to_thread(_drop_zip_cache, record.session_id)
         return {"message": f"Renamed {old_path} to {new_path}"}
     
     except SQLAlchemyError as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error renaming: {str(e)}")
-    finally:
-        db.close()
 
 
 @app.post("/delete-file")
-async def delete_file(username: str = Form(...), filepath: str = Form(...)):
+async def delete_file(username: str = Form(...), filepath: str = Form(...), workspace: tuple[UserRecord, str] = Depends(require_active_workspace_form)):
     """Delete file / folder recursively if directory."""
-    db = next(get_db())
-    
     try:
-        # Check if user is logged in
-        user_container = get_user_container(db, username)
-        if not user_container:
-            raise HTTPException(status_code=404, detail="User not logged in")
-        if not getattr(user_container, 'session_id', None):
-            raise HTTPException(status_code=409, detail="No active session. Please login/start container again")
-        user_workdir = os.path.join(BASE_WORKDIR, user_container.session_id)
+        record, user_workdir = workspace
         full_path = os.path.join(user_workdir, filepath.lstrip("/"))
         
         # Security check: ensure path is within user directory
-        if not os.path.abspath(full_path).startswith(os.path.abspath(user_workdir)):
+        if not _within_workdir(full_path, user_workdir, follow_symlinks=False):
             raise HTTPException(status_code=400, detail="Invalid file path")
 
-        if not os.path.exists(full_path):
+        if not os.path.lexists(full_path):
             raise HTTPException(status_code=404, detail="File or folder not found")
 
-        if os.path.isdir(full_path):
-            shutil.rmtree(full_path)
+        # Removal of a large tree can take seconds; keep it off the event loop
+        if os.path.isdir(full_path) and not os.path.islink(full_path):
+            removed_size = await asyncio.to_thread(_dir_size, full_path)
+            _invalidate_dir_size(full_path)
+            _invalidate_dir_size(os.path.dirname(full_path))
+            await asyncio.to_thread(_fast_rmtree, full_path)
+            _adjust_workspace_usage(user_workdir, -removed_size)
+            await asyncio.to_thread(_drop_zip_cache, record.session_id)
             return {"message": f"Folder deleted: {filepath}"}
         else:
-            os.remove(full_path)
+            removed_size = os.lstat(full_path).st_size
+            _invalidate_dir_size(os.path.dirname(full_path))
+            await asyncio.to_thread(os.remove, full_path)
+            _adjust_workspace_usage(user_workdir, -removed_size)
             return {"message": f"File deleted: {filepath}"}
     
     except SQLAlchemyError as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error deleting: {str(e)}")
-    finally:
-        db.close()
 
 
 from fastapi import UploadFile, File
-from fastapi.responses import FileResponse, StreamingResponse
+from fastapi.responses import FileResponse, StreamingResponse, Response
+
+
+UPLOAD_COPY_CHUNK = 1024 * 1024
+UPLOAD_PARALLELISM = 4  # concurrent part copies per request; keeps spinning disks from thrashing
+
+
+def _stage_upload(src, fd: int, tmp_path: str) -> int:
+    """Copy an upload stream into the hidden temp file open on ``fd``; returns its size."""
+    try:
+        with os.fdopen(fd, "wb") as out:
+            src.seek(0)
+            shutil.copyfileobj(src, out, UPLOAD_COPY_CHUNK)
+            size = out.tell()
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    return size
 
 
 @app.post("/upload-files")
-async def upload_files(username: str = Form(...), files: list[UploadFile] = File(...), target_path: str = Form("/")):
+async def upload_files(username: str = Form(...), files: list[UploadFile] = File(...), target_path: str = Form("/"), workspace: tuple[UserRecord, str] = Depends(require_active_workspace_form)):
     """Upload multiple files with aggregate quota check."""
-    db = next(get_db())
-    
     try:
-        # Check if user is logged in
-        user_container = get_user_container(db, username)
-        if not user_container:
-            raise HTTPException(status_code=404, detail="User not logged in")
-        if not getattr(user_container, 'session_id', None):
-            raise HTTPException(status_code=409, detail="No active session. Please login/start container again")
-        user_workdir = os.path.join(BASE_WORKDIR, user_container.session_id)
+        user_container, user_workdir = workspace
         target_dir = os.path.join(user_workdir, target_path.lstrip("/"))
         
         # Security check: ensure path is within user directory
-        if not os.path.abspath(target_dir).startswith(os.path.abspath(user_workdir)):
+        if not _within_workdir(target_dir, user_workdir):
             raise HTTPException(status_code=400, detail="Invalid target path")
 
         os.makedirs(target_dir, exist_ok=True)
@@ -1340,30 +1920,60 @@ async def upload_files(username: str = Form(...), files: list[UploadFile] = File
         if conflicts:
             raise HTTPException(status_code=409, detail=f"File(s) already exist: {', '.join(conflicts)}")
 
-        # Quota check: pre-read all sizes first (only after conflict-free)
+        # Quota check (only after conflict-free). The multipart parser already spooled each part
+        # and recorded its size, so reject over-quota batches before copying anything.
         quota_bytes = getattr(user_container, 'quota_bytes', 50 * 1024 * 1024)
-        current_total = _dir_size(user_workdir)
-        incoming_total = 0
-        file_blobs: list[tuple[str, bytes]] = []
-        for file in files:
-            if file.filename:
-                content = await file.read()
-                incoming_total += len(content)
-                file_blobs.append((file.filename, content))
-        if current_total + incoming_total > quota_bytes:
-            raise HTTPException(status_code=403, detail="Quota exceeded by upload")
-        # Write after passing check
-        for fname, content in file_blobs:
-            file_path = os.path.join(target_dir, fname)
-            # Use exclusive creation to avoid races
-            try:
-                fd = os.open(file_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
-                with os.fdopen(fd, "wb") as buffer:
-                    buffer.write(content)
-            except FileExistsError:
-                # Should not happen due to pre-check, but guard anyway
-                raise HTTPException(status_code=409, detail=f"File already exists: {fname}")
-            uploaded_files.append(fname)
+        current_total = _workspace_usage(user_workdir)
+        uploads = [file for file in files if file.filename]
+        if all(file.size is not None for file in uploads):
+            if current_total + sum(file.size for file in uploads) > quota_bytes:
+                raise HTTPException(status_code=403, detail="Quota exceeded by upload")
+
+        # Stream each part to a temp file beside its destination (peak memory: one chunk per
+        # copy, UPLOAD_PARALLELISM copies at a time), then move into place only once the whole
+        # batch fits the quota.
+        staged: list[tuple[str, str, int]] = []  # (filename, temp path, size)
+        # Every temp file, recorded before its copy starts: if the request is cancelled the
+        # worker threads keep running, and the rollback must still know what they write to
+        tmp_paths: list[str] = []
+        copy_slots = asyncio.Semaphore(UPLOAD_PARALLELISM)
+
+        async def _stage(file: UploadFile) -> tuple[str, int]:
+            async with copy_slots:
+                fd, tmp_path = tempfile.mkstemp(dir=target_dir, prefix=".upload-", suffix=".part")
+                tmp_paths.append(tmp_path)
+                return tmp_path, await asyncio.to_thread(_stage_upload, file.file, fd, tmp_path)
+
+        try:
+            # return_exceptions: let every copy finish so all temp files are known to the rollback
+            results = await asyncio.gather(*(_stage(file) for file in uploads), return_exceptions=True)
+            for file, result in zip(uploads, results):
+                if not isinstance(result, BaseException):
+                    staged.append((file.filename, *result))
+            for result in results:
+                if isinstance(result, BaseException):
+                    raise result
+            if current_total + sum(size for _, _, size in staged) > quota_bytes:
+                raise HTTPException(status_code=403, detail="Quota exceeded by upload")
+            for fname, tmp_path, size in staged:
+                file_path = os.path.join(target_dir, fname)
+                if os.path.exists(file_path):
+                    # Should not happen due to pre-check, but guard anyway
+                    raise HTTPException(status_code=409, detail=f"File already exists: {fname}")
+                await asyncio.to_thread(os.replace, tmp_path, file_path)
+                _adjust_workspace_usage(user_workdir, size)
+                uploaded_files.append(fname)
+        finally:
+            # Roll back anything not moved into place (quota failure, conflict, I/O error,
+            # cancellation); an unlinked file a late copy is still writing goes away on close
+            for tmp_path in tmp_paths:
+                try:
+                    os.remove(tmp_path)
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    logger.warning("[UPLOAD_WARN] Could not remove temp file %s: %s", tmp_path, e)
+            _invalidate_dir_size(target_dir)
 
         return {"message": f"Uploaded {len(uploaded_files)} files", "files": uploaded_files}
     
@@ -1371,120 +1981,437 @@ async def upload_files(username: str = Form(...), files: list[UploadFile] = File
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error uploading files: {str(e)}")
-    finally:
-        db.close()
+
+
+class _LargeChunkFileResponse(FileResponse):
+    # 1 MiB reads instead of Starlette's 64 KiB: ~16x fewer read/send round-trips per byte
+    chunk_size = 1024 * 1024
 
 
 @app.get("/download-file/{username}")
-async def download_file(username: str, filepath: str):
+async def download_file(username: str, filepath: str, if_none_match: str | None = Header(default=None), workspace: tuple[UserRecord, str] = Depends(require_active_workspace)):
     """Download single file."""
-    db = next(get_db())
-    
     try:
-        # Check if user is logged in
-        user_container = get_user_container(db, username)
-        if not user_container:
-            raise HTTPException(status_code=404, detail="User not logged in")
-        if not getattr(user_container, 'session_id', None):
-            raise HTTPException(status_code=409, detail="No active session. Please login/start container again")
-        user_workdir = os.path.join(BASE_WORKDIR, user_container.session_id)
+        _, user_workdir = workspace
         full_path = os.path.join(user_workdir, filepath.lstrip("/"))
         
         # Security check: ensure path is within user directory
-        if not os.path.abspath(full_path).startswith(os.path.abspath(user_workdir)):
+        if not _within_workdir(full_path, user_workdir):
             raise HTTPException(status_code=400, detail="Invalid file path")
 
-        if not os.path.exists(full_path) or os.path.isdir(full_path):
+        try:
+            st = os.stat(full_path)
+        except OSError:
+            st = None
+        if st is None or stat.S_ISDIR(st.st_mode):
             raise HTTPException(status_code=404, detail="File not found")
 
+        # Validator from mtime + size: a repeat download of an unchanged file is a 304
+        etag = f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+        if if_none_match and etag in (t.strip() for t in if_none_match.split(",")):
+            return Response(status_code=304, headers={"ETag": etag})
+
         filename = os.path.basename(full_path)
-        return FileResponse(
+        return _LargeChunkFileResponse(
             path=full_path,
             filename=filename,
-            media_type='application/octet-stream'
+            media_type='application/octet-stream',
+            stat_result=st,  # reuse the stat above (Content-Length / Last-Modified)
+            headers={"ETag": etag},
         )
     
     except SQLAlchemyError as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error downloading file: {str(e)}")
+
+
+# Content that is already compressed gains nothing from DEFLATE; store it as-is
+_ZIP_STORED_EXTS = frozenset({
+    ".zip", ".gz", ".tgz", ".bz2", ".xz", ".7z", ".rar", ".zst", ".whl", ".jar",
+    ".png", ".jpg", ".jpeg", ".gif", ".webp", ".mp3", ".mp4", ".mkv", ".webm",
+    ".npz", ".parquet", ".pt", ".pth",
+})
+# ZIP writer with parallel DEFLATE. Each file is cut into ZIP_BLOCK_SIZE blocks that are deflated
+# independently on ZIP_EXEC (zlib releases the GIL); every block but the last ends with a sync
+# flush, so the concatenated segments form one valid DEFLATE stream (the pigz scheme). Blocks are
+# emitted in order behind a bounded window, so memory stays at a few blocks per download. Sizes
+# and CRC follow each entry in a data descriptor; ZIP64 records are used only when needed.
+ZIP_BLOCK_SIZE = 1024 * 1024
+ZIP_WORKERS = min(8, os.cpu_count() or 2)
+ZIP_EXEC = ThreadPoolExecutor(max_workers=ZIP_WORKERS, thread_name_prefix="zip")
+_ZIP_WINDOW = 2 * ZIP_WORKERS  # blocks in flight per download
+_ZIP_FLUSH_AT = 256 * 1024     # coalesce headers / small blocks into larger body chunks
+_ZIP32_MAX = 0xFFFFFFFF
+_ZIP_SYSTEM = 0 if os.name == "nt" else 3  # "made by" host: MS-DOS / Unix (keeps unix modes)
+
+
+@dataclass(slots=True)
+class _ZipEntry:
+    name: bytes
+    flags: int
+    method: int
+    dos_time: int
+    dos_date: int
+    mode: int
+    zip64: bool
+    crc: int = 0
+    usize: int = 0
+    csize: int = 0
+    offset: int = 0
+
+
+def _deflate_block(data: bytes, last: bool) -> bytes:
+    comp = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)  # raw DEFLATE
+    return comp.compress(data) + comp.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+
+def _zip_entry(arcname: str, st: os.stat_result, stored: bool) -> _ZipEntry:
+    t = time.localtime(st.st_mtime)
+    if t.tm_year < 1980:
+        t = time.struct_time((1980, 1, 1, 0, 0, 0, 0, 0, -1))
+    try:
+        name = arcname.encode("ascii")
+        flags = 0x08                       # sizes/CRC in data descriptor
+    except UnicodeEncodeError:
+        name = arcname.encode("utf-8")
+        flags = 0x08 | 0x800               # + UTF-8 name
+    return _ZipEntry(
+        name=name,
+        flags=flags,
+        method=zipfile.ZIP_STORED if stored else zipfile.ZIP_DEFLATED,
+        dos_time=(t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2),
+        dos_date=((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday,
+        mode=st.st_mode & 0xFFFF,
+        # Decided up front from the stat size (with headroom for DEFLATE overhead)
+        zip64=st.st_size >= 0xF0000000,
+    )
+
+
+def _zip_local_header(e: _ZipEntry) -> bytes:
+    extra = struct.pack("<HHQQ", 0x0001, 16, 0, 0) if e.zip64 else b""
+    size_field = _ZIP32_MAX if e.zip64 else 0
+    return struct.pack(
+        "<IHHHHHIIIHH", 0x04034B50, 45 if e.zip64 else 20, e.flags, e.method,
+        e.dos_time, e.dos_date, 0, size_field, size_field, len(e.name), len(extra),
+    ) + e.name + extra
+
+
+def _zip_data_descriptor(e: _ZipEntry) -> bytes:
+    if e.zip64:
+        return struct.pack("<IIQQ", 0x08074B50, e.crc, e.csize, e.usize)
+    if e.csize > _ZIP32_MAX or e.usize > _ZIP32_MAX:
+        raise RuntimeError("file grew past 4 GiB while zipping")
+    return struct.pack("<IIII", 0x08074B50, e.crc, e.csize, e.usize)
+
+
+def _zip_central_directory(entries: list[_ZipEntry], cd_offset: int) -> bytes:
+    out = []
+    for e in entries:
+        z64 = []
+        usize, csize, offset = e.usize, e.csize, e.offset
+        if usize >= _ZIP32_MAX or e.zip64:
+            z64.append(usize)
+            usize = _ZIP32_MAX
+        if csize >= _ZIP32_MAX or e.zip64:
+            z64.append(csize)
+            csize = _ZIP32_MAX
+        if offset >= _ZIP32_MAX:
+            z64.append(offset)
+            offset = _ZIP32_MAX
+        extra = struct.pack(f"<HH{len(z64)}Q", 0x0001, 8 * len(z64), *z64) if z64 else b""
+        version = 45 if z64 else 20
+        out.append(struct.pack(
+            "<IHHHHHHIIIHHHHHII", 0x02014B50, (_ZIP_SYSTEM << 8) | version, version, e.flags,
+            e.method, e.dos_time, e.dos_date, e.crc, csize, usize, len(e.name), len(extra),
+            0, 0, 0, e.mode << 16, offset,
+        ))
+        out.append(e.name)
+        out.append(extra)
+    cd = b"".join(out)
+    count, cd_size = len(entries), len(cd)
+    tail = b""
+    if count >= 0xFFFF or cd_size >= _ZIP32_MAX or cd_offset >= _ZIP32_MAX:
+        eocd64_offset = cd_offset + cd_size
+        tail = struct.pack(
+            "<IQHHIIQQQQ", 0x06064B50, 44, 45, 45, 0, 0, count, count, cd_size, cd_offset,
+        ) + struct.pack("<IIQI", 0x07064B50, 0, eocd64_offset, 1)
+    tail += struct.pack(
+        "<IHHHHIIH", 0x06054B50, 0, 0, min(count, 0xFFFF), min(count, 0xFFFF),
+        min(cd_size, _ZIP32_MAX), min(cd_offset, _ZIP32_MAX), 0,
+    )
+    return cd + tail
+
+
+def _iter_zip(folder: str):
+    entries: list[_ZipEntry] = []
+    pending: deque = deque()  # ("header" | "data" | "end", entry, bytes | Future | None), in output order
+    in_flight = 0  # data blocks held in pending, stored or deflating; bounded by _ZIP_WINDOW
+    offset = 0
+    buf: list[bytes] = []
+    buf_len = 0
+
+    def drain(max_in_flight: int):
+        """Emit pending items in order; block on futures only while over the window."""
+        nonlocal in_flight, offset, buf_len
+        while pending:
+            kind, entry, payload = pending[0]
+            if kind == "header":
+                entry.offset = offset
+                data = _zip_local_header(entry)
+            elif kind == "end":
+                data = _zip_data_descriptor(entry)
+            elif isinstance(payload, bytes):
+                data = payload
+                in_flight -= 1
+                entry.csize += len(data)
+            else:
+                if in_flight <= max_in_flight and not payload.done():
+                    break
+                data = payload.result()
+                in_flight -= 1
+                entry.csize += len(data)
+            pending.popleft()
+            offset += len(data)
+            buf.append(data)
+            buf_len += len(data)
+            if buf_len >= _ZIP_FLUSH_AT:
+                yield b"".join(buf)
+                buf.clear()
+                buf_len = 0
+
+    def schedule(entry: _ZipEntry, block: bytes, last: bool):
+        nonlocal in_flight
+        entry.crc = zlib.crc32(block, entry.crc)
+        entry.usize += len(block)
+        if entry.method == zipfile.ZIP_STORED:
+            if not block:
+                return
+            pending.append(("data", entry, block))
+        else:
+            pending.append(("data", entry, ZIP_EXEC.submit(_deflate_block, block, last)))
+        in_flight += 1
+        yield from drain(_ZIP_WINDOW)
+
+    try:
+        for root, dirs, files in os.walk(folder):
+            for file in files:
+                abs_file = os.path.join(root, file)
+                if os.path.islink(abs_file):
+                    continue  # links may point outside the workspace (same rule as _within_workdir)
+                try:
+                    src = open(abs_file, "rb")
+                except OSError as e:
+                    logger.warning("[ZIP_WARN] Skipping %s: %s", abs_file, e)
+                    continue
+                with src:
+                    st = os.fstat(src.fileno())
+                    stored = os.path.splitext(file)[1].lower() in _ZIP_STORED_EXTS
+                    entry = _zip_entry(os.path.relpath(abs_file, folder).replace(os.sep, "/"), st, stored)
+                    pending.append(("header", entry, None))
+                    try:
+                        block = src.read(ZIP_BLOCK_SIZE)
+                        while True:
+                            # Read one block ahead so the final segment can be Z_FINISHed
+                            nxt = src.read(ZIP_BLOCK_SIZE) if len(block) == ZIP_BLOCK_SIZE else b""
+                            yield from schedule(entry, block, last=not nxt)
+                            if not nxt:
+                                break
+                            block = nxt
+                    except OSError as e:
+                        # Close the stream so the archive stays valid; this entry is truncated
+                        logger.warning("[ZIP_WARN] Truncated %s: %s", abs_file, e)
+                        yield from schedule(entry, b"", last=True)
+                pending.append(("end", entry, None))
+                entries.append(entry)
+        yield from drain(0)
+        buf.append(_zip_central_directory(entries, offset))
+        yield b"".join(buf)
     finally:
-        db.close()
+        # Client went away mid-download: drop queued compression work
+        for kind, _, payload in pending:
+            if kind == "data" and not isinstance(payload, bytes):
+                payload.cancel()
+
+
+# Built archives are kept per session under ZIP_CACHE_DIR as "<folder key>-<manifest digest>.zip".
+# The digest covers (path, mtime_ns, size) of every file _iter_zip would include, so an unchanged
+# tree costs one stat walk and is served from disk; any change yields a new name and a rebuild
+# (files can also change from inside the container, so explicit eviction alone would not do).
+# Each session's cache is capped at ZIP_CACHE_SESSION_MAX bytes: hits refresh an archive's mtime
+# and the least recently used archives are evicted after each build; an archive larger than the
+# cap is streamed without being kept. Renaming or deleting a folder drops the session's cache,
+# since archives are keyed by folder path and would otherwise be orphaned.
+ZIP_CACHE_DIR = os.path.join(BASE_WORKDIR_ABS, ".cache")
+ZIP_CACHE_SESSION_MAX = 256 * 1024 * 1024
+
+
+def _zip_manifest_digest(folder: str) -> str:
+    manifest = []
+    for root, dirs, files in os.walk(folder):
+        for file in files:
+            abs_file = os.path.join(root, file)
+            try:
+                st = os.lstat(abs_file)
+            except OSError:
+                continue
+            if stat.S_ISLNK(st.st_mode):
+                continue  # _iter_zip skips links too
+            manifest.append(f"{os.path.relpath(abs_file, folder)}\0{st.st_mtime_ns}\0{st.st_size}")
+    manifest.sort()
+    return hashlib.blake2b("\n".join(manifest).encode("utf-8", "surrogateescape"), digest_size=16).hexdigest()
 
 
-@app.get("/download-folder/{username}")
-async def download_folder(username: str, folderpath: str):
-    """Zip + download a folder (or entire workspace if root)."""
-    db = next(get_db())
+def _zip_cache_paths(session_id: str, folder: str, user_workdir: str) -> tuple[str, str]:
+    """(session cache dir, "<folder key>-") for a folder inside a workspace."""
+    rel = os.path.relpath(folder, user_workdir)
+    key = hashlib.blake2b(rel.encode("utf-8", "surrogateescape"), digest_size=8).hexdigest()
+    return os.path.join(ZIP_CACHE_DIR, session_id), f"{key}-"
+
+
+def _zip_cache_hit(path: str) -> bool:
+    """True if ``path`` is cached; marks it most recently used."""
+    try:
+        os.utime(path)
+        return True
+    except OSError:
+        return False
+
+
+def _trim_zip_cache(cache_dir: str, keep: str):
+    """Evict least recently used archives until the session cache fits ZIP_CACHE_SESSION_MAX."""
+    archives = []
+    with os.scandir(cache_dir) as it:
+        for entry in it:
+            if entry.name.endswith(".zip") and entry.path != keep:
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                archives.append((st.st_mtime_ns, st.st_size, entry.path))
+    try:
+        total = os.stat(keep).st_size + sum(size for _, size, _ in archives)
+    except OSError:
+        return
+    archives.sort()
+    for _, size, path in archives:
+        if total <= ZIP_CACHE_SESSION_MAX:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        total -= size
 
+
+def _iter_zip_cached(folder: str, cache_dir: str, prefix: str, digest: str):
+    """Stream a fresh archive while teeing it to disk; publish it only if it completed."""
+    os.makedirs(cache_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, prefix=".build-", suffix=".part")
+    out = os.fdopen(fd, "wb")
+    written = 0
+    completed = False
     try:
-        # Check if user is logged in
-        user_container = get_user_container(db, username)
-        if not user_container:
-            raise HTTPException(status_code=404, detail="User not logged in")
+        for chunk in _iter_zip(folder):
+            if out is not None:
+                written += len(chunk)
+                if written > ZIP_CACHE_SESSION_MAX:
+                    # Too big to keep: finish as a plain stream
+                    out.close()
+                    out = None
+                else:
+                    out.write(chunk)
+            yield chunk
+        if out is None:
+            return
+        out.close()
+        out = None
+        final = os.path.join(cache_dir, f"{prefix}{digest}.zip")
+        os.replace(tmp_path, final)
+        completed = True
+        # Older builds of the same folder are stale now
+        with os.scandir(cache_dir) as it:
+            for entry in it:
+                if entry.name.startswith(prefix) and entry.path != final:
+                    try:
+                        os.remove(entry.path)
+                    except OSError:
+                        pass
+        _trim_zip_cache(cache_dir, final)
+    finally:
+        if out is not None:
+            out.close()
+        if not completed:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
 
-        user_workdir = os.path.join(BASE_WORKDIR, getattr(user_container, 'session_id', None) or username)
+
+def _drop_zip_cache(session_id: str | None):
+    if session_id:
+        shutil.rmtree(os.path.join(ZIP_CACHE_DIR, session_id), ignore_errors=True)
+
+
+@app.get("/download-folder/{username}")
+async def download_folder(username: str, folderpath: str, workspace: tuple[UserRecord, str] = Depends(require_active_workspace)):
+    """Zip + download a folder (or entire workspace if root)."""
+    try:
+        record, user_workdir = workspace
         # If folderpath is empty or root-like, zip the whole user directory
         normalized = (folderpath or '').lstrip("/")
         full_path = os.path.join(user_workdir, normalized)
 
         # Security check: ensure path is within user directory
-        if not os.path.abspath(full_path).startswith(os.path.abspath(user_workdir)):
+        if not _within_workdir(full_path, user_workdir):
             raise HTTPException(status_code=400, detail="Invalid folder path")
 
         if not os.path.exists(full_path) or not os.path.isdir(full_path):
             raise HTTPException(status_code=404, detail="Folder not found")
 
-        # Create an in-memory ZIP of the folder
-        zip_buffer = io.BytesIO()
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for root, dirs, files in os.walk(full_path):
-                for file in files:
-                    abs_file = os.path.join(root, file)
-                    rel_path = os.path.relpath(abs_file, full_path)
-                    zipf.write(abs_file, arcname=rel_path)
-        zip_buffer.seek(0)
-
         # Name zip as username if zipping entire workspace, else folder name
         folder_name = username if (normalized == '' or normalized == '.' or normalized == '/') else os.path.basename(full_path.rstrip(os.sep))
         headers = {
             'Content-Disposition': f'attachment; filename="{folder_name}.zip"'
         }
-        return StreamingResponse(zip_buffer, media_type='application/zip', headers=headers)
+        cache_dir, prefix = _zip_cache_paths(record.session_id, full_path, user_workdir)
+        digest = await asyncio.to_thread(_zip_manifest_digest, full_path)
+        cached = os.path.join(cache_dir, f"{prefix}{digest}.zip")
+        if await asyncio.to_thread(_zip_cache_hit, cached):
+            return _LargeChunkFileResponse(cached, media_type='application/zip', headers=headers)
+        # Sync generator: Starlette drives it in a worker thread, so walking/deflating never
+        # blocks the loop and memory stays around one chunk instead of the whole archive.
+        return StreamingResponse(_iter_zip_cached(full_path, cache_dir, prefix, digest), media_type='application/zip', headers=headers)
 
     except SQLAlchemyError as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error downloading folder: {str(e)}")
-    finally:
-        db.close()
 
 
 @app.get("/read-file/{username}")
-async def read_file(username: str, filepath: str):
+async def read_file(username: str, filepath: str, workspace: tuple[UserRecord, str] = Depends(require_active_workspace)):
     """Read text file (normalized newlines)."""
-    db = next(get_db())
-    
     try:
-        # Check if user is logged in
-        user_container = get_user_container(db, username)
-        if not user_container:
-            raise HTTPException(status_code=404, detail="User not logged in")
-
-        user_workdir = os.path.join(BASE_WORKDIR, getattr(user_container, 'session_id', None) or username)
+        _, user_workdir = workspace
         full_path = os.path.join(user_workdir, filepath.lstrip("/"))
         
         # Security check: ensure path is within user directory
-        if not os.path.abspath(full_path).startswith(os.path.abspath(user_workdir)):
+        if not _within_workdir(full_path, user_workdir):
             raise HTTPException(status_code=400, detail="Invalid file path")
 
         if not os.path.exists(full_path) or os.path.isdir(full_path):
             raise HTTPException(status_code=404, detail="File not found")
 
-        with open(full_path, "r", encoding="utf-8") as f:
-            content = f.read()
-            # Normalize line endings when reading to ensure consistency
-            content = content.replace('\r\n', '\n').replace('\r', '\n')
+        def _read() -> str:
+            # Unbuffered readall sizes its buffer from fstat, so the file arrives in a single
+            # read() and is decoded once (no 8 KiB text-layer chunks)
+            with open(full_path, "rb", buffering=0) as f:
+                raw = f.read()
+            content = raw.decode("utf-8")
+            return content.replace('\r\n', '\n').replace('\r', '\n') if '\r' in content else content
+
+        content = await asyncio.to_thread(_read)
 
         return {"content": content, "filename": os.path.basename(full_path)}
     
@@ -1494,24 +2421,281 @@ async def read_file(username: str, filepath: str):
         raise HTTPException(status_code=400, detail="File is not a text file")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error reading file: {str(e)}")
-    finally:
-        db.close()
 
 
 
 
+class _TerminalSession:
+    """One exec'd bash bridged to at most one WebSocket at a time.
+
+    The exec socket is driven by loop reader/writer callbacks (or pump tasks when the stream has
+    no selectable fd). Between WebSockets the shell keeps running for TERMINAL_REATTACH_TTL, so a
+    reconnect after a network blip reattaches instead of paying for a new exec; output produced
+    meanwhile is buffered (up to TERMINAL_OUTPUT_HIGH_WATER) and delivered on reattach.
+    """
+
+    def __init__(self, username: str, container, sock):
+        self.username = username
+        self.container_id = container.id
+        self.sock = sock
+        self.loop = asyncio.get_running_loop()
+        self.raw_sock = _exec_raw_socket(sock)
+        if self.raw_sock is not None:
+            self.raw_sock.setblocking(False)
+        self.websocket: WebSocket | None = None
+        self.closed = False
+        self.reap_handle: asyncio.TimerHandle | None = None
+        self.pid_pending = True
+        self.pid_carry = b""
+        self.out_buf = bytearray()      # shell output not yet sent to the browser
+        self.recv_view = memoryview(bytearray(TERMINAL_RECV_SIZE))  # reused by every read
+        self.out_ready = asyncio.Event()
+        self.shell_eof = False
+        self.reading = False            # reader callback registered on raw_sock
+        self.in_buf = bytearray()       # input the socket has not accepted yet (one send drains it all)
+        self.in_room = asyncio.Event()  # set while in_buf is below TERMINAL_INPUT_MAX
+        self.in_room.set()
+        self.in_pending = asyncio.Event()
+        self.writing = False            # writer callback registered on raw_sock
+        self.watched = False            # raw_sock is driven by reader/writer callbacks
+        self.flush_timer: asyncio.TimerHandle | None = None
+        self.tasks: list[asyncio.Task] = []
+
+    def start(self):
+        if self.raw_sock is not None:
+            try:
+                self.loop.add_reader(self.raw_sock, self.on_readable)
+                self.reading = self.watched = True
+            except NotImplementedError:
+                pass
+        if not self.watched:
+            self.tasks.append(asyncio.create_task(self.pump_socket()))
+            self.tasks.append(asyncio.create_task(self.pump_input()))
+
+    def on_output(self, output: bytes | memoryview):
+        """Strip the in-band PID marker (first lines only) and queue output for the sender."""
+        if self.pid_pending:
+            output = self.pid_carry + output
+            self.pid_carry = b""
+            m = _SHELL_PID_MARKER_RE.search(output)
+            if m:
+                self.pid_pending = False
+                _register_shell_pid(self.username, int(m.group(1)), self.container_id)
+                output = output[:m.start()] + output[m.end():]
+            else:
+                # Marker split across reads: hold back the partial prefix
+                cut = output.rfind(b"\x1b")
+                tail = output[cut:] if cut != -1 else b""
+                if tail and len(tail) < 32 and _SHELL_PID_PREFIX.startswith(tail[:len(_SHELL_PID_PREFIX)]):
+                    output, self.pid_carry = output[:cut], tail
+        self.out_buf.extend(output)
+        self.schedule_flush()
+
+    def schedule_flush(self):
+        if len(self.out_buf) >= TERMINAL_FLUSH_BYTES:
+            self.out_ready.set()
+        elif self.flush_timer is None:
+            self.flush_timer = self.loop.call_later(TERMINAL_FLUSH_DELAY, self.out_ready.set)
+
+    def on_eof(self):
+        self.shell_eof = True
+        self.out_ready.set()
+
+    def on_readable(self):
+        try:
+            n = self.raw_sock.recv_into(self.recv_view)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            n = 0
+        if not n:
+            self.loop.remove_reader(self.raw_sock)
+            self.reading = False
+            self.on_eof()
+            return
+        self.on_output(self.recv_view[:n])  # copied into out_buf before the next read
+        if len(self.out_buf) >= TERMINAL_OUTPUT_HIGH_WATER:
+            # Browser is behind (or detached): stop reading until the sender catches up
+            # (bash blocks on a full pty)
+            self.loop.remove_reader(self.raw_sock)
+            self.reading = False
+
+    def on_writable(self):
+        try:
+            sent = self.raw_sock.send(self.in_buf)
+        except (BlockingIOError, InterruptedError):
+            sent = 0
+        except OSError:
+            sent = len(self.in_buf)  # shell side is gone; the reader reports EOF
+        del self.in_buf[:sent]
+        if not self.in_buf:
+            self.loop.remove_writer(self.raw_sock)
+            self.writing = False
+        if len(self.in_buf) < TERMINAL_INPUT_MAX:
+            self.in_room.set()
+
+    async def pump_socket(self):
+        """Reader for streams the loop cannot watch (Proactor loop, named pipe, SSH channel)."""
+        try:
+            while True:
+                if self.raw_sock is not None:
+                    n = await self.loop.sock_recv_into(self.raw_sock, self.recv_view)
+                    output = self.recv_view[:n]
+                else:
+                    output = await self.loop.run_in_executor(TERMINAL_EXECUTOR, self.sock.recv, TERMINAL_RECV_SIZE)
+                if not output:
+                    break
+                self.on_output(output)
+        except Exception:
+            pass
+        self.on_eof()
+
+    async def pump_input(self):
+        """Writer for streams the loop cannot watch: drains everything queued in one send."""
+        try:
+            while True:
+                await self.in_pending.wait()
+                self.in_pending.clear()
+                while self.in_buf:
+                    data = bytes(self.in_buf)
+                    self.in_buf.clear()
+                    self.in_room.set()
+                    if self.raw_sock is not None:
+                        await self.loop.sock_sendall(self.raw_sock, data)
+                    else:
+                        await self.loop.run_in_executor(TERMINAL_EXECUTOR, self.sock.sendall, data)
+        except Exception:
+            self.in_buf.clear()
+            self.in_room.set()
+
+    async def send_input(self, data: bytes):
+        """Write stdin now if the socket takes it; otherwise queue it, and frames that arrive
+        before the socket is next writable go out together. Raises once the session is closed."""
+        if self.closed:
+            raise ConnectionResetError("terminal session closed")
+        if self.watched and not self.in_buf:
+            try:
+                sent = self.raw_sock.send(data)
+            except (BlockingIOError, InterruptedError):
+                sent = 0
+            except OSError:
+                return  # shell side is gone; the reader reports EOF
+            if sent == len(data):
+                return
+            data = data[sent:]  # partial write: the writer callback sends the rest
+        self.in_buf.extend(data)
+        if not self.watched:
+            self.in_pending.set()
+        elif not self.writing:
+            self.loop.add_writer(self.raw_sock, self.on_writable)
+            self.writing = True
+        if len(self.in_buf) >= TERMINAL_INPUT_MAX:
+            self.in_room.clear()
+            await self.in_room.wait()
+        if self.closed:
+            raise ConnectionResetError("terminal session closed")
+
+    async def pump_output(self, websocket: WebSocket):
+        """Sender for the attached WebSocket; returns when the shell has exited and all is sent."""
+        while True:
+            await self.out_ready.wait()
+            if self.closed:
+                return
+            self.out_ready.clear()
+            if self.flush_timer is not None:
+                self.flush_timer.cancel()
+                self.flush_timer = None
+            if self.out_buf:
+                output = bytes(self.out_buf)
+                self.out_buf.clear()
+                if self.watched and not self.reading and not self.shell_eof:
+                    self.loop.add_reader(self.raw_sock, self.on_readable)
+                    self.reading = True
+                # Raw bytes as a binary frame: no decode/re-encode, and multi-byte characters
+                # split across reads reach xterm intact (status messages stay text frames)
+                try:
+                    await websocket.send_bytes(output)
+                except Exception:
+                    self.out_buf[:0] = output  # keep it for a reattaching WebSocket
+                    return
+            if self.shell_eof and not self.out_buf:
+                break
+
+    def attach(self, websocket: WebSocket) -> asyncio.Task:
+        if self.reap_handle is not None:
+            self.reap_handle.cancel()
+            self.reap_handle = None
+        self.websocket = websocket
+        if self.out_buf:
+            self.out_ready.set()  # deliver what the shell printed while detached
+        return asyncio.create_task(self.pump_output(websocket))
+
+    def detach(self, websocket: WebSocket):
+        if self.websocket is not websocket:
+            return
+        self.websocket = None
+        if self.shell_eof:
+            self.close()
+        elif TERMINAL_SESSIONS.get(self.username) is self:
+            self.reap_handle = self.loop.call_later(TERMINAL_REATTACH_TTL, self.close)
+        else:
+            self.close()
+
+    def close(self):
+        """Hang up the shell and forget its PID (also used by logout / admin stop)."""
+        if self.closed:
+            return
+        self.closed = True
+        if TERMINAL_SESSIONS.get(self.username) is self:
+            TERMINAL_SESSIONS.pop(self.username, None)
+        for handle in (self.flush_timer, self.reap_handle):
+            if handle is not None:
+                handle.cancel()
+        for task in self.tasks:
+            task.cancel()
+        if self.watched:
+            self.loop.remove_reader(self.raw_sock)
+            self.loop.remove_writer(self.raw_sock)
+        self.reading = self.writing = False
+        # Release anything parked on this session (a receive loop past TERMINAL_INPUT_MAX, the
+        # sender, the fallback input pump); each one checks `closed` when it wakes
+        self.in_buf.clear()
+        self.shell_eof = True
+        self.in_room.set()
+        self.out_ready.set()
+        self.in_pending.set()
+        try:
+            self.sock.close()
+            if self.raw_sock is not None:
+                self.raw_sock.close()  # SocketIO.close() leaves the socket open; this hangs up bash
+        except Exception:
+            pass
+        entry = SHELL_PIDS.get(self.username)
+        if entry and entry.get("container_id") == self.container_id:
+            SHELL_PIDS.pop(self.username, None)
+
+
+# Terminal sessions that can be reattached, by username (live or within TERMINAL_REATTACH_TTL)
+TERMINAL_SESSIONS: dict[str, _TerminalSession] = {}
+
+
+def _close_terminal_session(username: str):
+    session = TERMINAL_SESSIONS.get(username)
+    if session is not None:
+        session.close()
+
+
 @app.websocket("/ws/terminal")
-async def websocket_terminal(websocket: WebSocket):
-    """Interactive terminal over WebSocket (one bash per user)."""
+async def websocket_terminal(websocket: WebSocket, db: Session = Depends(get_db)):
+    """Interactive terminal over WebSocket (one bash per user, reattached on quick reconnects)."""
     await websocket.accept()
     websocket_closed = False
-    db = next(get_db())
-    container = None
-    user_container_record = None
     username: str | None = None
-    
+    session: _TerminalSession | None = None
+    sender: asyncio.Task | None = None
+
     try:
-        data = await websocket.receive_json()
+        data = orjson.loads(await websocket.receive_text())
         username = data.get("username")
 
         if not username:
@@ -1522,96 +2706,99 @@ async def websocket_terminal(websocket: WebSocket):
 
         # Get user container from database
         user_container_record = get_user_container(db, username)
+        # The session lives as long as the socket; hand the connection back to the pool now
+        db.close()
         if not user_container_record:
             await websocket.send_text("Error: User not logged in")
             websocket_closed = True
             await websocket.close()
             return
 
-        container = client.containers.get(user_container_record.container_id)
+        if await get_container_status(user_container_record.container_id) != "running":
+            await websocket.send_text("Error: Container not running")
+            websocket_closed = True
+            await websocket.close()
+            return
 
     # Register WebSocket for forced closure on logout
-        async with TERMINAL_CONNECTIONS_LOCK:
-            s = TERMINAL_CONNECTIONS.get(username)
-            if s is None:
-                s = set()
-                TERMINAL_CONNECTIONS[username] = s
-            s.add(websocket)
-        pid_file = _pid_file_path(username)
-
-    # Start interactive bash; record PID asynchronously
-        exec_instance = container.client.api.exec_create(
-            container.id,
-            ["/bin/bash", "-lc", f"echo $$ > {pid_file}; exec bash"],
-            stdin=True,
-            tty=True,
-            environment=["TERM=xterm-256color"],
-        )
-        sock = container.client.api.exec_start(exec_instance["Id"], tty=True, socket=True)
-        asyncio.create_task(_store_shell_pid(container, username, user_container_record.container_id))
-
-        loop = asyncio.get_event_loop()
+        TERMINAL_CONNECTIONS[username].add(websocket)
 
-        async def read_output():
-            nonlocal websocket_closed
-            while True:
-                try:
-                    output = await loop.run_in_executor(None, sock.recv, 1024)
-                    if not output:
-                        break
-                    decoded = output.decode("utf-8", errors="ignore")
-                    if decoded and not websocket_closed:
-                        await websocket.send_text(decoded)
-                except Exception:
-                    break
+        existing = TERMINAL_SESSIONS.get(username)
+        if (existing is not None and existing.websocket is None and not existing.shell_eof
+                and existing.container_id == user_container_record.container_id):
+            # Reconnect within the grace period: reuse the running shell and its socket
+            session = existing
+        else:
+            if existing is not None and existing.websocket is None:
+                existing.close()  # stale (shell exited or container replaced)
+            # Status came from the shared cache; build the handle without another inspect
+            container = client.containers.prepare_model({"Id": user_container_record.container_id})
+            # Start interactive bash; it announces its (container-namespace) PID in-band
+            exec_instance = container.client.api.exec_create(
+                container.id,
+                ["/bin/bash", "-lc", f"printf '\\033]{_SHELL_PID_OSC};%s\\007' $$; exec bash"],
+                stdin=True,
+                tty=True,
+                environment=["TERM=xterm-256color"],
+            )
+            sock = container.client.api.exec_start(exec_instance["Id"], tty=True, socket=True)
+            session = _TerminalSession(username, container, sock)
+            # A second tab keeps its own shell; only one session per user is kept for reattach
+            TERMINAL_SESSIONS.setdefault(username, session)
+            session.start()
+        sender = session.attach(websocket)
 
-        async def write_input():
-            nonlocal websocket_closed
-            while True:
-                try:
-                    msg = await websocket.receive_json()
-                    if "input" in msg:
-                        sock.send(msg["input"].encode("utf-8"))
-                except WebSocketDisconnect:
-                    websocket_closed = True
-                    break
-                except Exception:
+        while True:
+            try:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
                     websocket_closed = True
                     break
-
-        await asyncio.gather(read_output(), write_input())
+                data = message.get("bytes")
+                if data is not None:
+                    # Binary frame = raw stdin bytes, forwarded as-is (the frontend's input path)
+                    await session.send_input(data)
+                    continue
+                frame = message.get("text") or ""
+                # Text frames: only those that look like a JSON envelope are parsed; anything else
+                # (or a keystroke that merely starts with "{") is forwarded as raw stdin
+                if frame.startswith("{"):
+                    try:
+                        msg = orjson.loads(frame)
+                    except orjson.JSONDecodeError:
+                        msg = None
+                    if isinstance(msg, dict):
+                        if "input" in msg:
+                            await session.send_input(msg["input"].encode("utf-8"))
+                        continue
+                await session.send_input(frame.encode("utf-8"))
+            except WebSocketDisconnect:
+                websocket_closed = True
+                break
+            except ConnectionResetError:
+                break  # session closed under us (logout, admin stop, reap); close the socket below
+            except Exception:
+                websocket_closed = True
+                break
 
     except WebSocketDisconnect:
         websocket_closed = True
-        print("Terminal WebSocket disconnected")
+        logger.info("Terminal WebSocket disconnected")
     except Exception as e:
         if not websocket_closed:
             await websocket.send_text(f"Terminal Error: {str(e)}")
     finally:
-        # Close database connection
-        db.close()
+        if sender is not None:
+            sender.cancel()
+        if session is not None:
+            session.detach(websocket)
         # Deregister connection
         if username:
-            async def _deregister():
-                async with TERMINAL_CONNECTIONS_LOCK:
-                    s = TERMINAL_CONNECTIONS.get(username)
-                    if s and websocket in s:
-                        s.discard(websocket)
-                        if not s:
-                            TERMINAL_CONNECTIONS.pop(username, None)
-            asyncio.create_task(_deregister())
-    # Remove stored shell PID (best effort)
-        if username and container is not None and user_container_record is not None:
-            async def _cleanup_pid() -> None:
-                async with SHELL_PIDS_LOCK:
-                    entry = SHELL_PIDS.get(username)
-                    if entry and entry.get("container_id") == user_container_record.container_id:
-                        SHELL_PIDS.pop(username, None)
-                try:
-                    await asyncio.to_thread(container.exec_run, ["bash", "-lc", f"rm -f {_pid_file_path(username)}"], demux=False)
-                except Exception:
-                    pass
-            asyncio.create_task(_cleanup_pid())
+            conns = TERMINAL_CONNECTIONS.get(username)
+            if conns is not None:
+                conns.discard(websocket)
+                if not conns:
+                    TERMINAL_CONNECTIONS.pop(username, None)
         # Only close websocket if not already closed
         if not websocket_closed:
             try:
@@ -1621,10 +2808,47 @@ async def websocket_terminal(websocket: WebSocket):
                 pass
 
 
+# Workspace trees are deleted here rather than on the BackgroundTasks threadpool (shared with
+# sync endpoints), so several large logouts can't tie it up. Two workers: removal is disk-bound.
+CLEANUP_EXEC = ThreadPoolExecutor(max_workers=2, thread_name_prefix="cleanup")
+
+
+def _remove_session_workspace(username: str, session_id: str):
+    target_dir = os.path.join(BASE_WORKDIR_ABS, session_id)
+    if os.path.exists(target_dir):
+        try:
+            _fast_rmtree(target_dir)
+        except Exception as e:
+            logger.warning("File cleanup warning for %s: %s", username, e)
+    _invalidate_dir_size(target_dir)
+    _forget_workspace_usage(target_dir)
+    _drop_zip_cache(session_id)
+
+
 @app.post("/logout")
 async def logout(background_tasks: BackgroundTasks, username: str = Form(...)):
     """Logout: schedule container removal + workspace deletion + close terminals."""
-    db = next(get_db())
+
+    # Close active terminals for this user (best effort). In-memory only, so this runs even when
+    # the record is already gone (e.g. admin stop deleted it while a terminal stayed open).
+    async def close_terminals(u_name: str):
+        # Detach the whole set in one step (copied: closing handlers still discard from it)
+        conns = list(TERMINAL_CONNECTIONS.pop(u_name, ()))
+        for ws in conns:
+            try:
+                if ws.application_state != WebSocketState.DISCONNECTED:
+                    await ws.send_text("Logout: terminal connection closing")
+                    await ws.close()
+            except Exception:
+                pass
+    if username in TERMINAL_CONNECTIONS:
+        # Fire and forget
+        asyncio.create_task(close_terminals(username))
+    _close_terminal_session(username)
+
+    if username not in ACTIVE_USERS:
+        # No container record (already logged out, or a stale retry): skip the DB entirely
+        return {"message": f"Logout scheduled for {username}"}
 
     def do_cleanup(u_name: str, container_id: str | None, session_id: str | None):
         """Background cleanup: stop/remove old container and delete workspace IF the user hasn't re-logged in.
@@ -1634,90 +2858,60 @@ async def logout(background_tasks: BackgroundTasks, username: str = Form(...)):
         try:
             if container_id:
                 try:
-                    container = client.containers.get(container_id)
-                    container.stop()
-                    container.remove()
+                    _stop_and_remove_container(container_id)
                 except docker.errors.NotFound:
                     pass
                 except Exception as e:
-                    print(f"Cleanup warning for {u_name}: {e}")
+                    logger.warning("Cleanup warning for %s: %s", u_name, e)
         except Exception as e:
-            print(f"Background cleanup (container) error for {u_name}: {e}")
+            logger.error("Background cleanup (container) error for %s: %s", u_name, e)
 
         # DB-aware guard: only delete workspace and/or DB record if no newer session exists
-        db2 = None
         try:
-            db2 = SessionLocal()
-            current = get_user_container(db2, u_name)
+            with SessionLocal() as db2:
+                current = get_user_container(db2, u_name)
 
-            # Regardless of re-login, it's safe to delete the old session's workspace (session-scoped dirs)
-            if session_id:
-                target_dir = os.path.join(BASE_WORKDIR, session_id)
-                if os.path.exists(target_dir):
-                    try:
-                        shutil.rmtree(target_dir)
-                    except Exception as e:
-                        print(f"File cleanup warning for {u_name}: {e}")
+                # Regardless of re-login, it's safe to delete the old session's workspace (session-scoped dirs).
+                # Handed to CLEANUP_EXEC so a large tree doesn't hold this background-task thread.
+                if session_id:
+                    CLEANUP_EXEC.submit(_remove_session_workspace, u_name, session_id)
 
-            # Finally, remove the DB record only if it still points at the old session
-            if current is None or (session_id is not None and getattr(current, 'session_id', None) == session_id):
-                try:
-                    delete_user_container(db2, u_name)
-                except Exception:
-                    pass
+                # Finally, remove the DB record only if it still points at the old session
+                if current is None or (session_id is not None and getattr(current, 'session_id', None) == session_id):
+                    try:
+                        delete_user_container(db2, u_name)
+                    except Exception:
+                        pass
         except Exception as e:
-            print(f"Background cleanup (db) error for {u_name}: {e}")
-        finally:
-            try:
-                if db2:
-                    db2.close()
-            except Exception:
-                pass
+            logger.error("Background cleanup (db) error for %s: %s", u_name, e)
 
     try:
-        # Idempotent: proceed even if record already missing
-        user_container = get_user_container(db, username)
-        container_id = user_container.container_id if user_container else None
-        session_id = getattr(user_container, 'session_id', None) if user_container else None
+        with SessionLocal() as db:
+            # Idempotent: proceed even if record already missing
+            user_container = get_user_container(db, username)
+            container_id = user_container.container_id if user_container else None
+            session_id = getattr(user_container, 'session_id', None) if user_container else None
 
-        # Remove DB record early so username can be reused quickly
-        if user_container:
-            delete_user_container(db, username)
+            # Remove DB record early so username can be reused quickly
+            if user_container:
+                delete_user_container(db, username)
 
         # Schedule cleanup in background
         background_tasks.add_task(do_cleanup, username, container_id, session_id)
 
-        # Close active terminals for this user (best effort)
-        async def close_terminals(u_name: str):
-            # Snapshot under lock then close outside lock
-            conns: list[WebSocket] = []
-            async with TERMINAL_CONNECTIONS_LOCK:
-                s = TERMINAL_CONNECTIONS.get(u_name)
-                if s:
-                    conns = list(s)
-                    TERMINAL_CONNECTIONS.pop(u_name, None)
-            for ws in conns:
-                try:
-                    if ws.application_state != WebSocketState.DISCONNECTED:
-                        await ws.send_text("Logout: terminal connection closing")
-                        await ws.close()
-                except Exception:
-                    pass
-        # Fire and forget
-        asyncio.create_task(close_terminals(username))
-
         return {"message": f"Logout scheduled for {username}"}
 
     except SQLAlchemyError as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error scheduling logout: {str(e)}")
-    finally:
-        db.close()
 
 
 if __name__ == "__main__":
     import uvicorn
     print("Database URL:", DATABASE_URL)
     print("Starting Mini-Colab server...")
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    # uvloop drives the terminal bridge's add_reader/add_writer callbacks on the raw exec socket;
+    # it has no Windows build, where the stock loop and the executor fallback are used instead.
+    loop = "auto" if os.name == "nt" else "uvloop"
+    uvicorn.run(app, host="0.0.0.0", port=8000, loop=loop)
\ No newline at end of file
@@ -0,0 +1,34 @@
+"""Import the backend once for the whole test session.
+
+app.py talks to Docker and the database at import time, so the Docker client is replaced with a
+mock and the database points at a throwaway SQLite file; tests exercise the pure helpers.
+"""
+
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+from unittest import mock
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_RUNTIME_DIR = tempfile.mkdtemp(prefix="minicolab-tests-")
+atexit.register(shutil.rmtree, _RUNTIME_DIR, True)
+
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_RUNTIME_DIR, 'test.db')}"
+sys.path.insert(0, BACKEND_DIR)
+
+_cwd = os.getcwd()
+os.chdir(_RUNTIME_DIR)  # ./user_code and friends are created relative to the working directory
+try:
+    with mock.patch("docker.from_env", return_value=mock.MagicMock()):
+        import app as _app
+finally:
+    os.chdir(_cwd)
+
+
+@pytest.fixture
+def app():
+    return _app
@@ -0,0 +1,73 @@
+import orjson
+
+
+def _wire(obj):
+    """What the browser sees: orjson-encoded, then parsed back."""
+    return orjson.loads(orjson.dumps(obj))
+
+
+def _apply(prev: dict, frame: dict) -> dict:
+    """Python mirror of applyStatsFrame in frontend/src/components/AdminDashboard.tsx."""
+    removed = set(frame["removed"])
+    patches = {patch["username"]: patch for patch in frame["changed"]}
+    users = []
+    for user in prev["users"]:
+        if user["username"] in removed:
+            continue
+        patch = patches.pop(user["username"], None)
+        users.append({**user, **patch} if patch else user)
+    users.extend(patches.values())  # new users arrive as full rows
+    return {"overall": frame["overall"], "users": users}
+
+
+def _overall(containers: int, cpu: float) -> dict:
+    return {"containers": containers, "total_cpu_percent": cpu, "total_mem_usage": 0, "total_mem_percent": 0.0}
+
+
+def test_unchanged_snapshot_sends_nothing(app):
+    rows = [app.UserStatsRow("amy", "c1", "running", cpu_percent=1.5)]
+    prev = {"overall": _overall(1, 1.5), "users": rows}
+    curr = {"overall": _overall(1, 1.5), "users": [app.UserStatsRow("amy", "c1", "running", cpu_percent=1.5)]}
+    assert app._stats_delta(prev, curr) is None
+
+
+def test_delta_applied_to_previous_snapshot_gives_next(app):
+    job = app.JobRow(pid=20, command="python train.py", cpu_percent=5.5, mem_percent=1.0, elapsed_seconds=40)
+    prev = {
+        "overall": _overall(3, 3.0),
+        "users": [
+            app.UserStatsRow("amy", "c1", "running", cpu_percent=1.0, shell_pid=7),
+            app.UserStatsRow("bob", "c2", "running", cpu_percent=2.0, jobs=[job]),
+            app.UserStatsRow("cat", "c3", "exited"),
+        ],
+    }
+    curr = {
+        "overall": _overall(3, 9.5),
+        "users": [
+            app.UserStatsRow("amy", "c1", "running", cpu_percent=1.0, shell_pid=7),  # unchanged
+            app.UserStatsRow("bob", "c2", "running", cpu_percent=4.0, workspace_size=123, jobs=[]),
+            app.UserStatsRow("dan", "c4", "running", cpu_percent=5.5, mem_usage=1024),  # new
+        ],
+    }
+
+    frame = app._stats_delta(prev, curr)
+    assert frame["type"] == "delta"
+    assert frame["removed"] == ["cat"]
+    patches = {patch["username"]: patch for patch in _wire(frame)["changed"]}
+    assert set(patches) == {"bob", "dan"}
+    assert patches["bob"] == {"username": "bob", "cpu_percent": 4.0, "workspace_size": 123, "jobs": []}
+
+    assert _apply(_wire(prev), _wire(frame)) == _wire(curr)
+
+
+def test_consecutive_deltas_track_the_latest_snapshot(app):
+    snapshots = [
+        {"overall": _overall(1, 0.0), "users": [app.UserStatsRow("amy", "c1", "running")]},
+        {"overall": _overall(1, 2.0), "users": [app.UserStatsRow("amy", "c1", "running", cpu_percent=2.0)]},
+        {"overall": _overall(0, 0.0), "users": []},
+        {"overall": _overall(1, 0.0), "users": [app.UserStatsRow("amy", "c9", "running", quota_bytes=1 << 30)]},
+    ]
+    state = _wire(snapshots[0])
+    for prev, curr in zip(snapshots, snapshots[1:]):
+        state = _apply(state, _wire(app._stats_delta(prev, curr)))
+        assert state == _wire(curr)
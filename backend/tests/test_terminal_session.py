@@ -0,0 +1,94 @@
+import asyncio
+import socket
+from types import SimpleNamespace
+
+import pytest
+
+
+class _RecordingWebSocket:
+    def __init__(self):
+        self.frames: list[bytes] = []
+
+    async def send_bytes(self, data: bytes):
+        self.frames.append(data)
+
+
+def _open_session(app):
+    """A session bridged to one end of a socketpair; the other end plays the exec'd bash."""
+    ours, shell = socket.socketpair()
+    ours.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4096)  # fill up quickly
+    shell.settimeout(1)
+    session = app._TerminalSession("alice", SimpleNamespace(id="cid"), ours)
+    session.start()
+    return session, shell
+
+
+def test_close_releases_send_input_blocked_on_high_water(app):
+    async def main():
+        session, shell = _open_session(app)
+        try:
+            # The "shell" never reads, so input piles up past TERMINAL_INPUT_MAX
+            blocked = asyncio.create_task(session.send_input(b"x" * (2 * app.TERMINAL_INPUT_MAX)))
+            await asyncio.sleep(0.05)
+            assert not blocked.done()
+            session.close()
+            with pytest.raises(ConnectionResetError):
+                await asyncio.wait_for(blocked, timeout=1)
+            assert not session.in_buf
+        finally:
+            shell.close()
+
+    asyncio.run(main())
+
+
+def test_send_input_after_close_raises(app):
+    async def main():
+        session, shell = _open_session(app)
+        try:
+            session.close()
+            with pytest.raises(ConnectionResetError):
+                await session.send_input(b"ls\n")
+        finally:
+            shell.close()
+
+    asyncio.run(main())
+
+
+def test_close_stops_sender(app):
+    async def main():
+        session, shell = _open_session(app)
+        try:
+            websocket = _RecordingWebSocket()
+            sender = session.attach(websocket)
+            shell.sendall(b"hello\n")
+            await asyncio.sleep(0.05)
+            assert b"".join(websocket.frames) == b"hello\n"
+            session.close()
+            await asyncio.wait_for(sender, timeout=1)
+        finally:
+            shell.close()
+
+    asyncio.run(main())
+
+
+def test_input_reaches_shell_and_output_strips_pid_marker(app):
+    async def main():
+        session, shell = _open_session(app)
+        try:
+            websocket = _RecordingWebSocket()
+            sender = session.attach(websocket)
+            await session.send_input(b"echo hi\n")
+            assert shell.recv(100) == b"echo hi\n"
+            shell.sendall(b"\x1b]" + app._SHELL_PID_OSC.encode() + b";4242\x07$ ")
+            await asyncio.sleep(0.05)
+            assert b"".join(websocket.frames) == b"$ "
+            assert app.SHELL_PIDS["alice"] == {"pid": 4242, "container_id": "cid"}
+            shell.close()  # bash exits: the sender drains and finishes on its own
+            await asyncio.wait_for(sender, timeout=1)
+            session.detach(websocket)
+            assert session.closed
+            assert "alice" not in app.SHELL_PIDS
+        finally:
+            shell.close()
+
+    asyncio.run(main())
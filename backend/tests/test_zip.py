@@ -0,0 +1,162 @@
+import dataclasses
+import io
+import os
+import struct
+import zipfile
+from concurrent.futures import Future
+from types import SimpleNamespace
+
+import pytest
+
+
+def _build_zip(app, folder) -> bytes:
+    return b"".join(app._iter_zip(str(folder)))
+
+
+def _write_tree(root, files: dict[str, bytes]):
+    for rel, data in files.items():
+        path = root / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+
+
+def test_archive_round_trips_through_zipfile(app, tmp_path, monkeypatch):
+    # Small blocks so one file spans several parallel DEFLATE segments
+    monkeypatch.setattr(app, "ZIP_BLOCK_SIZE", 4096)
+    files = {
+        "empty.txt": b"",
+        "main.py": b"print('hello')\n",
+        "src/pkg/data.bin": os.urandom(3000) + b"abc" * 10000,
+        "exact.txt": b"z" * (2 * 4096),  # exact block multiple: final segment is empty
+        "photo.png": os.urandom(5000),
+        "notes-é.txt": "unicode name".encode(),
+    }
+    _write_tree(tmp_path, files)
+
+    with zipfile.ZipFile(io.BytesIO(_build_zip(app, tmp_path))) as zf:
+        assert zf.testzip() is None
+        assert {name: zf.read(name) for name in zf.namelist()} == files
+        assert zf.getinfo("photo.png").compress_type == zipfile.ZIP_STORED
+        assert zf.getinfo("main.py").compress_type == zipfile.ZIP_DEFLATED
+        assert zf.getinfo("empty.txt").file_size == 0
+
+
+def test_stored_blocks_count_toward_the_window(app, tmp_path, monkeypatch):
+    # A DEFLATE block that never finishes on its own must hold back the stored blocks behind it
+    monkeypatch.setattr(app, "ZIP_BLOCK_SIZE", 1024)
+    _write_tree(tmp_path, {"a.txt": b"a" * 1024, "sub/b.png": os.urandom(64 * 1024)})
+    scheduled = 0
+    held = []
+    real_zlib = app.zlib
+
+    def crc32(data, value=0):
+        nonlocal scheduled
+        scheduled += 1
+        return real_zlib.crc32(data, value)
+
+    class SlowFuture(Future):
+        def __init__(self, fn, *args):
+            super().__init__()
+            self.call, self.index = (fn, args), scheduled
+
+        def done(self):
+            return False
+
+        def result(self, timeout=None):
+            held.append(scheduled - self.index)
+            fn, args = self.call
+            return fn(*args)
+
+    monkeypatch.setattr(app, "zlib", SimpleNamespace(**{**vars(real_zlib), "crc32": crc32}))
+    monkeypatch.setattr(app, "ZIP_EXEC", SimpleNamespace(submit=SlowFuture))
+    with zipfile.ZipFile(io.BytesIO(_build_zip(app, tmp_path))) as zf:
+        assert zf.testzip() is None
+    assert held and max(held) <= app._ZIP_WINDOW + 1
+
+
+def test_empty_folder_gives_empty_archive(app, tmp_path):
+    with zipfile.ZipFile(io.BytesIO(_build_zip(app, tmp_path))) as zf:
+        assert zf.namelist() == []
+
+
+def test_zip64_entries_round_trip(app, tmp_path, monkeypatch):
+    # Take the ZIP64 header / data-descriptor branch without writing 4 GiB to disk
+    make_entry = app._zip_entry
+    monkeypatch.setattr(app, "_zip_entry", lambda *a: dataclasses.replace(make_entry(*a), zip64=True))
+    files = {"empty.bin": b"", "big.bin": os.urandom(2000) + b"y" * 50000}
+    _write_tree(tmp_path, files)
+    data = _build_zip(app, tmp_path)
+
+    sig, version, _, _, _, _, _, csize, usize, name_len, extra_len = struct.unpack("<IHHHHHIIIHH", data[:30])
+    assert (sig, version) == (0x04034B50, 45)
+    assert csize == usize == 0xFFFFFFFF
+    assert extra_len == 20
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        assert zf.testzip() is None
+        assert {name: zf.read(name) for name in zf.namelist()} == files
+
+
+def test_entries_near_4gib_are_zip64(app):
+    def stat_of(size):
+        return os.stat_result((0o100644, 0, 0, 1, 0, 0, size, 0, 0, 0))
+
+    assert app._zip_entry("big.bin", stat_of(0xF0000000), False).zip64
+    assert not app._zip_entry("small.bin", stat_of(0xF0000000 - 1), False).zip64
+
+
+def test_data_descriptor_rejects_growth_past_4gib(app):
+    entry = app._zip_entry("grew.bin", os.stat_result((0o100644, 0, 0, 1, 0, 0, 10, 0, 0, 0)), False)
+    entry.usize = entry.csize = 5 << 30
+    with pytest.raises(RuntimeError):
+        app._zip_data_descriptor(entry)
+    entry.zip64 = True
+    assert struct.unpack("<IIQQ", app._zip_data_descriptor(entry)) == (0x08074B50, 0, 5 << 30, 5 << 30)
+
+
+def test_central_directory_past_4gib(app):
+    entry = app._ZipEntry(
+        name=b"big.bin", flags=0x08, method=zipfile.ZIP_DEFLATED, dos_time=0, dos_date=33,
+        mode=0o100644, zip64=False, crc=1, usize=6 << 30, csize=5 << 30, offset=5 << 30,
+    )
+    cd_offset = 11 << 30
+    data = app._zip_central_directory([entry], cd_offset)
+
+    header = struct.unpack("<IHHHHHHIIIHHHHHII", data[:46])
+    assert header[0] == 0x02014B50
+    assert header[8] == header[9] == header[16] == 0xFFFFFFFF  # csize, usize, offset
+    name_len, extra_len = header[10], header[11]
+    extra = data[46 + name_len:46 + name_len + extra_len]
+    assert struct.unpack("<HHQQQ", extra) == (0x0001, 24, 6 << 30, 5 << 30, 5 << 30)
+
+    cd_size = 46 + name_len + extra_len
+    eocd64 = struct.unpack("<IQHHIIQQQQ", data[cd_size:cd_size + 56])
+    assert eocd64[0] == 0x06064B50
+    assert eocd64[6:] == (1, 1, cd_size, cd_offset)
+    locator = struct.unpack("<IIQI", data[cd_size + 56:cd_size + 76])
+    assert locator == (0x07064B50, 0, cd_offset + cd_size, 1)
+    eocd = struct.unpack("<IHHHHIIH", data[-22:])
+    assert eocd[0] == 0x06054B50
+    assert eocd[6] == 0xFFFFFFFF  # cd offset lives in the ZIP64 record
+
+
+def test_zip_cache_evicts_least_recently_used(app, tmp_path, monkeypatch):
+    monkeypatch.setattr(app, "ZIP_CACHE_SESSION_MAX", 2500)
+    cache_dir = tmp_path / "cache"
+    for name in ("a", "b", "c"):
+        _write_tree(tmp_path / name, {"f.bin": os.urandom(1000)})
+    b"".join(app._iter_zip_cached(str(tmp_path / "a"), str(cache_dir), "a-", "1"))
+    b"".join(app._iter_zip_cached(str(tmp_path / "b"), str(cache_dir), "b-", "1"))
+    os.utime(cache_dir / "a-1.zip", ns=(0, 0))
+    os.utime(cache_dir / "b-1.zip", ns=(1, 1))
+    assert app._zip_cache_hit(str(cache_dir / "a-1.zip"))  # a is now the most recent
+    b"".join(app._iter_zip_cached(str(tmp_path / "c"), str(cache_dir), "c-", "1"))
+    assert sorted(os.listdir(cache_dir)) == ["a-1.zip", "c-1.zip"]
+
+
+def test_zip_cache_skips_archives_over_the_cap(app, tmp_path, monkeypatch):
+    monkeypatch.setattr(app, "ZIP_CACHE_SESSION_MAX", 500)
+    cache_dir = tmp_path / "cache"
+    _write_tree(tmp_path / "big", {"f.bin": os.urandom(1000)})
+    data = b"".join(app._iter_zip_cached(str(tmp_path / "big"), str(cache_dir), "big-", "1"))
+    assert zipfile.ZipFile(io.BytesIO(data)).read("f.bin")
+    assert os.listdir(cache_dir) == []
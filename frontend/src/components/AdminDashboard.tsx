@@ -45,6 +45,16 @@ interface AdminStatsResponse {
   users: AdminUserRow[];
 }
 
+// WS frames: a full snapshot first, then field-level deltas against the last applied state
+type AdminStatsFrame =
+  | (AdminStatsResponse & { type?: 'snapshot' })
+  | {
+      type: 'delta';
+      overall: AdminStatsOverall;
+      changed: Array<Partial<AdminUserRow> & { username: string }>;
+      removed: string[];
+    };
+
 interface AdminDashboardProps {
   token: string;
   changePasswordTrigger?: MutableRefObject<(() => void) | null>;
@@ -98,6 +108,26 @@ const mergeStats = (prev: AdminStatsResponse | null, next: AdminStatsResponse):
   return { overall: mergedOverall, users: mergedUsers };
 };
 
+const statsFrameDecoder = new TextDecoder();
+
+const applyStatsFrame = (prev: AdminStatsResponse | null, frame: AdminStatsFrame): AdminStatsResponse | null => {
+  if (frame.type !== 'delta') return mergeStats(prev, frame);
+  if (!prev) return null; // delta without a base snapshot; wait for reconnect
+  const removed = new Set(frame.removed);
+  const patches = new Map(frame.changed.map(p => [p.username, p] as const));
+  const users = prev.users
+    .filter(u => !removed.has(u.username))
+    .map(u => {
+      const patch = patches.get(u.username);
+      if (!patch) return u;
+      patches.delete(u.username);
+      return { ...u, ...patch };
+    });
+  // Remaining patches are new users (sent as full rows)
+  patches.forEach(p => users.push(p as AdminUserRow));
+  return mergeStats(prev, { overall: frame.overall, users });
+};
+
 const AdminDashboard: React.FC<AdminDashboardProps> = ({ token, changePasswordTrigger, onPasswordBusyChange, pushNotice }) => {
   const [stats, setStats] = useState<AdminStatsResponse | null>(null);
   const [expanded, setExpanded] = useState<string | null>(null);
@@ -162,23 +192,26 @@ const AdminDashboard: React.FC<AdminDashboardProps> = ({ token, changePasswordTr
     const connect = () => {
       if (cancelled) return;
       const ws = new WebSocket(`${WS_BASE_URL}/admin/ws/stats?token=${encodeURIComponent(token)}`);
+      ws.binaryType = 'arraybuffer';
       wsRef.current = ws;
       ws.onopen = () => { reconnectAttempts.current = 0; };
       ws.onmessage = ev => {
         try {
-          const parsed: AdminStatsResponse = JSON.parse(ev.data);
-          // Merge with previous to retain object identity for unchanged rows
-          setStats(prev => {
-            const merged = mergeStats(prev, parsed);
-            lastStatsRef.current = merged;
-            return merged;
-          });
+          // Stats frames arrive as binary (UTF-8 JSON bytes)
+          const text = typeof ev.data === 'string' ? ev.data : statsFrameDecoder.decode(ev.data as ArrayBuffer);
+          const frame = JSON.parse(text);
+          if (!frame || frame.error) return;
+          // Apply snapshot/delta; merging retains object identity for unchanged rows
+          const merged = applyStatsFrame(lastStatsRef.current, frame as AdminStatsFrame);
+          if (!merged) return;
+          lastStatsRef.current = merged;
+          setStats(merged);
           // Reconcile killingJobs: remove those whose PID disappeared (kill applied)
           setKillingJobs(prev => {
             if (!prev.size) return prev;
             const active = new Set<string>();
             const userMap = new Map<string, Set<number>>();
-            parsed.users.forEach(u => {
+            merged.users.forEach(u => {
               const set = new Set<number>((u.jobs || []).map(j => j.pid));
               userMap.set(u.username, set);
             });
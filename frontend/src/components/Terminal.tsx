@@ -32,7 +32,7 @@ const TerminalComponent: React.FC<TerminalProps> = ({ username, commandToExecute
       setTimeout(() => {
         if (wsRef.current && wsRef.current.readyState === WebSocket.OPEN) {
           // Send the command followed by Enter
-          apiService.sendToWebSocket(wsRef.current, { input: command + '\r' });
+          apiService.sendTerminalInput(wsRef.current, command + '\r');
         }
       }, 500);
     }
@@ -55,7 +55,7 @@ const TerminalComponent: React.FC<TerminalProps> = ({ username, commandToExecute
     }
   }, [commandToExecute, executionKey, isConnected, executeCommand, onCommandExecuted]);
 
-  const safeWrite = React.useCallback((text: string) => {
+  const safeWrite = React.useCallback((text: string | Uint8Array) => {
     try {
       const el = terminalRef.current as HTMLDivElement | null;
       if (!el || !xtermRef.current) return;
@@ -211,7 +211,7 @@ const TerminalComponent: React.FC<TerminalProps> = ({ username, commandToExecute
   // Shell input → WS
       xtermRef.current?.onData((data) => {
         if (wsRef.current && wsRef.current.readyState === WebSocket.OPEN) {
-          apiService.sendToWebSocket(wsRef.current, { input: data });
+          apiService.sendTerminalInput(wsRef.current, data);
         }
       });
 
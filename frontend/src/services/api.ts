@@ -46,6 +46,8 @@ export interface WebSocketMessage {
   input?: string;
 }
 
+const textEncoder = new TextEncoder();
+
 export const apiService = {
   login: async (username: string): Promise<LoginResponse> => {
     const formData = new FormData();
@@ -110,12 +112,21 @@ export const apiService = {
     }
   },
 
+  // Terminal stdin goes out as a binary frame of raw UTF-8 bytes (no JSON envelope to build or parse)
+  sendTerminalInput: (ws: WebSocket, data: string) => {
+    if (ws.readyState === WebSocket.OPEN) {
+      ws.send(textEncoder.encode(data));
+    }
+  },
+
   // Create WebSocket for terminal connection
-  createTerminalWebSocket: (onMessage: (data: string) => void, onClose?: () => void): WebSocket => {
+  createTerminalWebSocket: (onMessage: (data: string | Uint8Array) => void, onClose?: () => void): WebSocket => {
     const ws = new WebSocket(`${WS_BASE_URL}/ws/terminal`);
+    // Shell output arrives as binary frames (raw bytes); status/error messages are text
+    ws.binaryType = 'arraybuffer';
     
     ws.onmessage = (event) => {
-      onMessage(event.data);
+      onMessage(typeof event.data === 'string' ? event.data : new Uint8Array(event.data));
     };
     
     ws.onclose = () => {